@@ -1,22 +1,65 @@
 import praw
+import os
+import shutil
 from collections import defaultdict
 import pandas as pd
 from datetime import datetime
 import time
 from tqdm import tqdm
+from activity_windows import join_window_counts, window_columns
+from arcticshift.records import ITEM_SCHEMA, RecordBuffer
+from comment_trees import author_name, iter_comment_trees
+from crawl_journal import CrawlJournal
+from dataset_io import DATA_FORMAT, DatasetWriter, read_dataset, stage_path, write_dataset
+from incremental import StageManifest
+from reddit_cache import HistoryCache, ProfileCache, fetch_profile
+from reddit_client import RedditClient
 from secret import secret  # Ensure secret.py has your Reddit API credentials
 
 # Initialize Reddit API client
 reddit = praw.Reddit(**secret)
+# Pooled client for bulk listing and comment-tree requests
+client = RedditClient(secret)
+
+# Join dates and account status shared with the other scripts
+profile_cache = ProfileCache()
+# Every user's fetched comments and submissions, so re-runs only page back to what is new
+history_cache = HistoryCache()
 
 # Subreddits as constants
 DEPRESSION_SUBREDDIT = 'depression'
 HUMOR_SUBREDDIT = 'funny'
+TARGET_SUBREDDITS = [DEPRESSION_SUBREDDIT, HUMOR_SUBREDDIT]
 
 # Rate limiting constants
-SUBMISSION_DELAY = 0.001  # seconds between submissions
-COMMENT_DELAY = 0.0001     # seconds between comment operations
 MAX_RETRIES = 3       # maximum number of retries for rate-limited operations
+# "load more" expansion per submission; requests are paced by the client's rate limiter
+MORE_BUDGET = 0       # /api/morechildren calls per submission (0 keeps only the first page of comments)
+COMMENT_DEPTH = None  # maximum reply depth to fetch, None for Reddit's default
+
+# Users whose histories are fetched before their join activity is counted in one batch
+USER_BLOCK = 500
+
+# Checkpointing
+JOURNAL_PATH = 'crawl_journal.sqlite'
+LISTING_CURSOR = 'depression_listing'
+# r/depression comments collected from the submission listing, merged across runs
+DEPRESSION_COMMENTS_FILE = stage_path('depression_comments')
+# One file of comments per checkpointed submission, until they are merged into DEPRESSION_COMMENTS_FILE
+COMMENT_PARTS_DIR = 'depression_comments.parts'
+
+# Output columns, covering users with and without r/funny activity
+RESULT_COLUMNS = [
+    'Username', 'Join Date (r/depression)', 'Posts in r/depression', 'Comments in r/depression',
+    'Texts in r/depression', 'Join Date (r/funny)',
+    'Posts in r/depression before joining r/funny', 'Comments in r/depression before joining r/funny',
+    'Posts in r/depression after joining r/funny', 'Comments in r/depression after joining r/funny',
+    'Posts in r/funny', 'Comments in r/funny', 'Texts in r/funny',
+]
+
+# Extra before/after-join windows in days, e.g. (30, 90, 365); each adds four columns
+JOIN_WINDOWS_DAYS = ()
+RESULT_COLUMNS += window_columns(JOIN_WINDOWS_DAYS)
 
 def wait_with_backoff(retry_count):
     """Implement exponential backoff"""
@@ -24,10 +67,14 @@ def wait_with_backoff(retry_count):
     time.sleep(wait_time)
 
 def get_user_join_date(username):
+    profile = profile_cache.get(username)
+    if profile is not None:
+        return datetime.utcfromtimestamp(profile['created_utc']) if profile['created_utc'] else None
     for retry in range(MAX_RETRIES):
         try:
-            user = reddit.redditor(username)
-            return datetime.utcfromtimestamp(user.created_utc)
+            created_utc, status = fetch_profile(reddit, username)
+            profile_cache.put(username, created_utc, status)
+            return datetime.utcfromtimestamp(created_utc) if created_utc else None
         except Exception as e:
             if '429' in str(e):
                 print(f"Rate limited while fetching join date, retrying... ({retry + 1}/{MAX_RETRIES})")
@@ -37,42 +84,92 @@ def get_user_join_date(username):
                 return None
     return None
 
-def collect_depression_data(limit=100):
-    depression_users = defaultdict(lambda: {'join_date': None, 'posts': 0, 'comments': 0, 'comment_texts': []})
-    subreddit = reddit.subreddit(DEPRESSION_SUBREDDIT)
+def save_comment_part(parts_dir, submission_id, comments):
+    """Write a submission's RecordBuffer of comments to its own file, replacing an earlier try."""
+    os.makedirs(parts_dir, exist_ok=True)
+    part_file = os.path.join(parts_dir, submission_id + DATA_FORMAT)
+    # Written under a temporary name first, so a part file is always complete
+    temp_file = os.path.join(parts_dir, '~' + submission_id + DATA_FORMAT)
+    write_dataset(comments.to_pandas(), temp_file)
+    os.replace(temp_file, part_file)
+
+def merge_comment_parts(parts_dir, manifest):
+    """Merge every part file into the manifest's output in one pass and remove them.
+
+    Parts left by an interrupted run are merged by the next one; rows the output
+    already has are skipped. Returns the number of new or changed comments.
+    """
+    if not os.path.isdir(parts_dir):
+        return 0
+    part_files = sorted((os.path.join(parts_dir, name) for name in os.listdir(parts_dir)
+                         if not name.startswith('~')), key=os.path.getmtime)
+    with DatasetWriter(manifest.delta_path) as writer:
+        for new_rows in manifest.new_rows(read_dataset(part_file) for part_file in part_files):
+            writer.write(new_rows)
+    merged = manifest.merge()
+    shutil.rmtree(parts_dir)
+    return merged
+
+def collect_depression_data(limit=100, journal=None, comments_dir=None):
+    """Collect r/depression users from the newest submissions.
+
+    Comment trees are fetched for many submissions at once, and join dates are looked
+    up for every author that has none yet, so a failed lookup is tried again the next
+    time the author shows up. With a journal, every processed
+    submission is checkpointed together with the users it touched, and a restart
+    resumes the listing right after the last one.
+
+    With comments_dir, each submission's comment texts are buffered in a RecordBuffer
+    of ITEM_SCHEMA and written to a part file there at the same checkpoint, so an
+    interrupted run keeps the comments of every submission the journal counts as
+    done; merge_comment_parts() combines them afterwards.
+    """
+    depression_users = defaultdict(lambda: {'join_date': None, 'posts': 0, 'comments': 0})
+    cursor = {'after': None, 'processed': 0}
+    if journal is not None:
+        depression_users.update(journal.load_candidates())
+        cursor = journal.get_cursor(LISTING_CURSOR, cursor)
     
     print("Collecting users from r/depression...")
-    submissions_processed = 0
+    submissions_processed = cursor['processed']
     
     while submissions_processed < limit:
         try:
-            for submission in tqdm(subreddit.new(limit=limit), desc="Fetching r/depression users"):
-                if submission.author:
-                    user = submission.author.name
+            params = {'after': cursor['after']} if cursor['after'] else {}
+            submissions = client.listing(f"/r/{DEPRESSION_SUBREDDIT}/new", params=params,
+                                         limit=limit - submissions_processed)
+            trees = iter_comment_trees(client, submissions, more_budget=MORE_BUDGET, depth=COMMENT_DEPTH)
+            for submission, tree_comments in tqdm(trees, desc="Fetching r/depression users"):
+                touched_users = set()
+                comments = RecordBuffer(ITEM_SCHEMA)
+                if author_name(submission):
+                    user = author_name(submission)
                     depression_users[user]['posts'] += 1
+                    touched_users.add(user)
+
+                for comment in tree_comments:
+                    if author_name(comment):
+                        user = author_name(comment)
+                        depression_users[user]['comments'] += 1
+                        touched_users.add(user)
+                        if comments_dir is not None:
+                            comments.append(user, comment['body'], int(comment['created_utc']),
+                                            DEPRESSION_SUBREDDIT, 'comment',
+                                            f"https://www.reddit.com{comment['permalink']}")
+
+                # Authors whose join date is still missing (new, or an earlier lookup failed)
+                for user in touched_users:
                     if not depression_users[user]['join_date']:
                         depression_users[user]['join_date'] = get_user_join_date(user)
-                        time.sleep(COMMENT_DELAY)
-
-                try:
-                    submission.comments.replace_more(limit=0)
-                    for comment in submission.comments.list():
-                        if comment.author:
-                            user = comment.author.name
-                            depression_users[user]['comments'] += 1
-                            if not depression_users[user]['join_date']:
-                                depression_users[user]['join_date'] = get_user_join_date(user)
-                            depression_users[user]['comment_texts'].append({
-                                'text': comment.body,
-                                'created_utc': comment.created_utc
-                            })
-                            time.sleep(COMMENT_DELAY)
-                except Exception as e:
-                    print(f"Error processing comments for submission: {e}")
-                    continue
 
                 submissions_processed += 1
-                time.sleep(SUBMISSION_DELAY)
+                cursor = {'after': submission['name'], 'processed': submissions_processed}
+                # Comments first: a submission saved without them would not be fetched again
+                if comments_dir is not None and len(comments):
+                    save_comment_part(comments_dir, submission['id'], comments)
+                if journal is not None:
+                    journal.save_progress(LISTING_CURSOR, cursor,
+                                          {user: depression_users[user] for user in touched_users})
 
                 if submissions_processed >= limit:
                     break
@@ -87,118 +184,171 @@ def collect_depression_data(limit=100):
                 print(f"Error collecting depression subreddit data: {e}")
                 return depression_users
 
-def fetch_user_activity(username, subreddit_name):
-    posts = []
-    comments = []
-    
+    return depression_users
+
+def fetch_user_history(username, subreddits, incremental=True):
+    """Walk a user's comments and submissions once and sort them into every target subreddit.
+
+    Everything fetched goes into the history cache. In incremental mode a history that
+    was fetched recently is answered from the cache alone, and otherwise paging stops
+    at the newest item already cached. Deleted and suspended accounts (404/403) have
+    no history; when the fetch fails otherwise and the cache is not fresh, RuntimeError
+    is raised so the user is not counted as having no activity.
+    """
+    if incremental and history_cache.is_fresh(username):
+        return history_cache.activity(username, subreddits)
+
+    watermarks = history_cache.watermarks(username) if incremental else {}
+    error = None
     for retry in range(MAX_RETRIES):
         try:
             user = reddit.redditor(username)
-            
-            # Fetch comments
-            for comment in user.comments.new(limit=None):
-                if comment.subreddit.display_name.lower() == subreddit_name.lower():
-                    comments.append({
-                        'text': comment.body,
-                        'created_utc': comment.created_utc
-                    })
-                time.sleep(COMMENT_DELAY)
-            
-            # Fetch submissions
-            for submission in user.submissions.new(limit=None):
-                if submission.subreddit.display_name.lower() == subreddit_name.lower():
-                    posts.append({
-                        'created_utc': submission.created_utc
-                    })
-                time.sleep(COMMENT_DELAY)
-            
-            return posts, comments
+            items = []
+            for kind, listing in (('comment', user.comments.new(limit=None)),
+                                  ('post', user.submissions.new(limit=None))):
+                newest = watermarks.get(kind)
+                for item in listing:
+                    # Listings are newest first, so everything past this point is cached already
+                    if newest is not None and item.created_utc < newest:
+                        break
+                    text = item.body if kind == 'comment' else None
+                    items.append((kind, item.id, item.subreddit.display_name, item.created_utc, text))
+            history_cache.add(username, items)
+            return history_cache.activity(username, subreddits)
 
         except Exception as e:
+            error = e
             if '429' in str(e):
                 print(f"Rate limited while fetching user activity, retrying... ({retry + 1}/{MAX_RETRIES})")
                 wait_with_backoff(retry)
+            elif '404' in str(e) or '403' in str(e):
+                # Deleted or suspended account: nothing to fetch
+                return history_cache.activity(username, subreddits)
             else:
-                print(f"Error in fetch_user_activity for {username}: {e}")
-                return [], []
-    
-    return [], []
+                print(f"Error in fetch_user_history for {username}: {e}")
+                break
 
-def process_user_activity(username, dep_data):
-    try:
-        join_depression_date = dep_data['join_date']
-        depression_posts, depression_comments = fetch_user_activity(username, DEPRESSION_SUBREDDIT)
-        funny_posts, funny_comments = fetch_user_activity(username, HUMOR_SUBREDDIT)
-        
-        # Skip if no activity in r/funny
-        if not funny_posts and not funny_comments:
-            return {
-                'Username': username,
-                'Join Date (r/depression)': join_depression_date,
-                'Posts in r/depression': len(depression_posts),
-                'Comments in r/depression': len(depression_comments),
-                'Texts in r/depression': [c['text'] for c in depression_comments],
-                'Join Date (r/funny)': None,
-                'Posts in r/funny': 0,
-                'Comments in r/funny': 0,
-                'Texts in r/funny': []
-            }
-        
-        # Find earliest r/funny activity
-        all_funny_times = ([p['created_utc'] for p in funny_posts] + 
-                          [c['created_utc'] for c in funny_comments])
-        join_funny_date = min(all_funny_times) if all_funny_times else None
-        
-        if join_funny_date:
-            # Count depression activity before and after joining r/funny
-            dep_posts_before = sum(1 for p in depression_posts if p['created_utc'] < join_funny_date)
-            dep_posts_after = sum(1 for p in depression_posts if p['created_utc'] >= join_funny_date)
-            dep_comments_before = sum(1 for c in depression_comments if c['created_utc'] < join_funny_date)
-            dep_comments_after = sum(1 for c in depression_comments if c['created_utc'] >= join_funny_date)
-            
-            return {
-                'Username': username,
-                'Join Date (r/depression)': join_depression_date,
-                'Join Date (r/funny)': datetime.utcfromtimestamp(join_funny_date),
-                'Posts in r/depression before joining r/funny': dep_posts_before,
-                'Comments in r/depression before joining r/funny': dep_comments_before,
-                'Posts in r/depression after joining r/funny': dep_posts_after,
-                'Comments in r/depression after joining r/funny': dep_comments_after,
-                'Posts in r/funny': len(funny_posts),
-                'Comments in r/funny': len(funny_comments),
-                'Texts in r/depression': [c['text'] for c in depression_comments],
-                'Texts in r/funny': [c['text'] for c in funny_comments]
-            }
+    if history_cache.is_fresh(username):
+        return history_cache.activity(username, subreddits)
+    raise RuntimeError(f"Could not fetch the history of {username}: {error}")
+
+def fetch_user_activity(username, subreddit_name):
+    activity = fetch_user_history(username, [subreddit_name])[subreddit_name]
+    return activity['posts'], activity['comments']
+
+def count_join_activity(usernames):
+    """r/depression posts and comments before and after joining r/funny for many users in one batch.
+
+    Works on the cached histories, so the users should have been fetched first.
+    """
+    events = history_cache.events(usernames, TARGET_SUBREDDITS)
+    return join_window_counts(events, anchor=HUMOR_SUBREDDIT, target=DEPRESSION_SUBREDDIT,
+                              windows=JOIN_WINDOWS_DAYS)
+
+def process_user_activity(username, dep_data, join_counts=None):
+    """One result row for a user, or None when they have r/funny activity but no join date.
+
+    join_counts may come from count_join_activity() over many users; users missing
+    from it are counted on their own. Errors are raised to the caller.
+    """
+    join_depression_date = dep_data['join_date']
+    history = fetch_user_history(username, TARGET_SUBREDDITS)
+    depression_posts = history[DEPRESSION_SUBREDDIT]['posts']
+    depression_comments = history[DEPRESSION_SUBREDDIT]['comments']
+    funny_posts = history[HUMOR_SUBREDDIT]['posts']
+    funny_comments = history[HUMOR_SUBREDDIT]['comments']
+    
+    # Skip if no activity in r/funny
+    if not funny_posts and not funny_comments:
+        return {
+            'Username': username,
+            'Join Date (r/depression)': join_depression_date,
+            'Posts in r/depression': len(depression_posts),
+            'Comments in r/depression': len(depression_comments),
+            'Texts in r/depression': [c['text'] for c in depression_comments],
+            'Join Date (r/funny)': None,
+            'Posts in r/funny': 0,
+            'Comments in r/funny': 0,
+            'Texts in r/funny': []
+        }
+    
+    # Earliest r/funny activity and depression activity before and after it, from the window counts
+    if join_counts is None or username not in join_counts.index:
+        join_counts = count_join_activity([username])
+    counts = join_counts.reindex([username]).iloc[0]
+    join_funny_date = counts['join_utc']
+    
+    if pd.notna(join_funny_date):
+        dep_posts_before = int(counts['posts_before'])
+        dep_posts_after = int(counts['posts_after'])
+        dep_comments_before = int(counts['comments_before'])
+        dep_comments_after = int(counts['comments_after'])
         
-    except Exception as e:
-        print(f"Error processing user {username}: {e}")
+        return {
+            'Username': username,
+            'Join Date (r/depression)': join_depression_date,
+            'Join Date (r/funny)': datetime.utcfromtimestamp(join_funny_date),
+            'Posts in r/depression before joining r/funny': dep_posts_before,
+            'Comments in r/depression before joining r/funny': dep_comments_before,
+            'Posts in r/depression after joining r/funny': dep_posts_after,
+            'Comments in r/depression after joining r/funny': dep_comments_after,
+            'Posts in r/funny': len(funny_posts),
+            'Comments in r/funny': len(funny_comments),
+            'Texts in r/depression': [c['text'] for c in depression_comments],
+            'Texts in r/funny': [c['text'] for c in funny_comments],
+            **{column: int(counts[column]) for column in window_columns(JOIN_WINDOWS_DAYS)}
+        }
     return None
 
 def main():
+    journal = CrawlJournal(JOURNAL_PATH)
+
     # Collect initial depression subreddit data
-    depression_users = collect_depression_data(limit=1000)  # Reduced limit for testing
-    user_data = []
-
-    # Process each user
-    print("\nProcessing users for r/funny activity...")
-    for username, dep_data in tqdm(depression_users.items(), desc="Processing users"):
-        result = process_user_activity(username, dep_data)
-        if result:
-            user_data.append(result)
-        time.sleep(2)  # Delay between processing users
-
-    # Save to Excel
+    depression_users = collect_depression_data(limit=1000, journal=journal,  # Reduced limit for testing
+                                               comments_dir=COMMENT_PARTS_DIR)
+    # Merge the collected comments into the ones of earlier runs
+    merge_comment_parts(COMMENT_PARTS_DIR, StageManifest(DEPRESSION_COMMENTS_FILE))
+
+    # Process each user that is not finished in the journal yet
+    finished_users = journal.finished_users()
+    pending_users = [(username, dep_data) for username, dep_data in depression_users.items()
+                     if username not in finished_users]
+    print(f"\nProcessing users for r/funny activity... ({len(finished_users)} already done)")
+    with tqdm(total=len(pending_users), desc="Processing users") as progress:
+        for start in range(0, len(pending_users), USER_BLOCK):
+            block = []
+            for username, dep_data in pending_users[start:start + USER_BLOCK]:
+                try:
+                    fetch_user_history(username, TARGET_SUBREDDITS)
+                    block.append((username, dep_data))
+                except Exception as e:
+                    # Not recorded, so the user is tried again on the next run
+                    print(f"Error processing user {username}: {e}")
+                progress.update(1)
+                time.sleep(2)  # Delay between processing users
+
+            # Count activity around the r/funny join date for the whole block at once, then record user by user
+            join_counts = count_join_activity([username for username, _ in block])
+            for username, dep_data in block:
+                try:
+                    result = process_user_activity(username, dep_data, join_counts)
+                except Exception as e:
+                    print(f"Error processing user {username}: {e}")
+                else:
+                    journal.record_result(username, result)
+
+    # Save to Excel, streaming the rows from the journal
     try:
-        df = pd.DataFrame(user_data)
-        df.to_excel('user_activity_depression_funny.xlsx', index=False)
+        journal.export_excel('user_activity_depression_funny.xlsx', RESULT_COLUMNS)
         print("Data saved to user_activity_depression_funny.xlsx")
     except Exception as e:
         print(f"Error saving to Excel: {e}")
         try:
-            df.to_csv('user_activity_depression_funny.csv', index=False)
+            journal.export_csv('user_activity_depression_funny.csv', RESULT_COLUMNS)
             print("Backup data saved to user_activity_depression_funny.csv")
         except Exception as e:
             print(f"Error saving backup data: {e}")
+    journal.close()
 
 if __name__ == '__main__':
     main()
@@ -1,28 +1,42 @@
-from empath import Empath
+from collections import deque
+
 import pandas as pd
 
-# Load your data
-file_name = "final.xlsx"  # Replace with your file name
-data = pd.read_excel(file_name)
+from dataset_io import EXPORT_EXCEL, DatasetWriter, export_excel, iter_dataset, resolve_input, stage_path
+from empath_scoring import score_chunks
+from incremental import StageManifest
+
+# Empath categories to score; any of Empath().cats can be added
+EMPATH_CATEGORIES = ["positive_emotion", "negative_emotion"]
+NUM_WORKERS = None  # defaults to the number of cores
+
+if __name__ == '__main__':
+    # Load your data
+    file_name = resolve_input("final")  # Replace with your file name
+    output_file = stage_path("data_with_empath_scores")
+    # Rows scored by earlier runs are skipped; only new or edited rows are scored
+    manifest = StageManifest(output_file, config={"categories": EMPATH_CATEGORIES})
 
-# Initialize Empath
-lexicon = Empath()
+    # Chunks waiting for their scores to come back from the pool
+    pending = deque()
 
-# Define a function to analyze text
-def analyze_text_with_empath(text):
-    if pd.isna(text):  # Handle missing values
-        return {}
-    return lexicon.analyze(text, categories=["positive_emotion", "negative_emotion"])
+    def texts_of(chunks):
+        for data in chunks:
+            pending.append(data)
+            yield data["Text"].tolist()
 
-# Apply the function to the "Text" column
-analysis_results = data["Text"].apply(analyze_text_with_empath)
+    # Score the "Text" column chunk by chunk in a process pool and save the results to a new file
+    with DatasetWriter(manifest.delta_path) as writer:
+        for empath_df in score_chunks(texts_of(manifest.new_rows(iter_dataset(file_name))), EMPATH_CATEGORIES,
+                                      workers=NUM_WORKERS):
+            data = pending.popleft()
+            empath_df.index = data.index
+            writer.write(pd.concat([data, empath_df], axis=1))
 
-# Convert results to DataFrame
-empath_df = pd.DataFrame(analysis_results.tolist())
-data_with_empath = pd.concat([data, empath_df], axis=1)
+    # Merge the new scores into the results of earlier runs
+    scored = manifest.merge()
 
-# Save the results to a new Excel file
-output_file = "data_with_empath_scores.xlsx"
-data_with_empath.to_excel(output_file, index=False)
+    if EXPORT_EXCEL:
+        export_excel(output_file)
 
-print(f"Empath analysis complete! Results saved to {output_file}.")
+    print(f"Empath analysis complete! Scored {scored} new or changed rows, results saved to {output_file}.")
@@ -1,19 +1,25 @@
 import openai
 import pandas as pd
-from tqdm import tqdm  # Import tqdm for the progress bar
 
+from dataset_io import read_dataset, resolve_input, write_dataset
+from incremental import ID_COLUMN, StageManifest
+from llm_backends import make_backend
+from llm_cache import LabelCache
+from llm_labeling import LabelTask
+from llm_prompts import MetricsLog
 from secret import api_key  # Import the API key from secret.py
 
-# Load your data
-df = pd.read_excel("filtered_depression_comments_and_posts.xlsx")
-comments = df['Text'].tolist()  # Include all comments
+# "openai" asks the API; "local" uses the model llm_backends.py trains on earlier GPT labels
+LABEL_BACKEND = "openai"
+LOCAL_MODEL = "local_humor_model.npz"
+# Local labels are kept apart from the GPT labels the local model is trained on
+OUTPUT_FILE = "labeled_humor.csv" if LABEL_BACKEND == "openai" else "labeled_humor_local.csv"
 
 # OpenAI API setup
 openai.api_key = api_key  # Replace with your actual API key
 
-# Function to label a comment
-def label_comment(comment):
-    prompt = f"""
+# Rubric sent in the system message of every request; the comments and the response format follow per request
+RUBRIC = """
     You are an advanced language model trained to analyze humor in comments. Your task is to evaluate comments based on two attributes related to humor:
 
     1. **Humor Intent**: Does the comment attempt to be humorous through jokes, puns, playful exaggerations, or other forms of comedic intent?  
@@ -39,50 +45,48 @@ def label_comment(comment):
        - Examples:
          - 5: "Haha, that's hilarious!"  
          - 0: "This makes no sense to me."
+"""
 
-    Comment: "{comment}"  
-    Response format:  
-    Humor Intent: [0–5]  
-    Commenter's Amusement: [0–5]  
-    """
+task = LabelTask(system_prompt="You are an advanced language model trained to analyze humor in comments.",
+                 rubric=RUBRIC,
+                 fields=['Humor Intent', "Commenter's Amusement"],
+                 scale="[0–5]")
 
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "You are an advanced language model trained to analyze humor in comments."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=50,
-            temperature=0.0
-        )
+if __name__ == '__main__':
+    # Load your data; only comments that are new or edited since the last run are labeled
+    # Labels are recomputed when the prompt or the model changes
+    manifest = StageManifest(OUTPUT_FILE, config={"template": task.template_hash(),
+                                                  "model": task.model if LABEL_BACKEND == "openai" else LOCAL_MODEL})
+    new_rows = list(manifest.new_rows([read_dataset(resolve_input("filtered_depression_comments_and_posts"))]))
+    df = pd.concat(new_rows) if new_rows else pd.DataFrame(columns=["Text", ID_COLUMN])
+    comments = df['Text'].tolist()
 
-        # Extract the response
-        result = response['choices'][0]['message']['content'].strip()
+    if LABEL_BACKEND == "openai":
+        # Labels from earlier runs are reused, so only new comments cost API calls
+        cache = LabelCache()
+        # Latency, tokens and estimated cost of every request go to llm_metrics.jsonl
+        metrics = MetricsLog()
+        engine = make_backend(LABEL_BACKEND, task, cache=cache, metrics=metrics)
+    else:
+        engine = make_backend(LABEL_BACKEND, task, LOCAL_MODEL)
 
-        # Ensure the response contains both attributes
-        if "Humor Intent" in result and "Commenter's Amusement" in result:
-            # Parse the scores
-            lines = result.split('\n')
-            humor_score = int(lines[0].split(":")[1].strip())
-            amusement_score = int(lines[1].split(":")[1].strip())
-            return humor_score, amusement_score
-        else:
-            return f"Unexpected response format: {result}"
+    # Label all comments concurrently
+    results = []
+    labels = engine.label_all(comments)
+    if LABEL_BACKEND == "openai":
+        print(f"LLM cache: {cache.stats()}")
+        print(f"Parse failures: {engine.parse_stats.report()}")
+        print(f"Requests: {metrics.summary()}")
+    for comment, row_id, result in zip(comments, df[ID_COLUMN], labels):
+        if isinstance(result, tuple):  # If it's a valid tuple
+            results.append((comment, result[0], result[1]))
+        else:  # If it's an error message
+            print(f"Error processing comment: {result}")
+            results.append((comment, None, None))
+            manifest.retry_later([row_id])  # Ask again on the next run
 
-    except Exception as e:
-        return f"Error processing comment: {e}"
-
-# Batch process comments with tqdm progress bar
-results = []
-for comment in tqdm(comments, desc="Processing comments"):
-    result = label_comment(comment)
-    if isinstance(result, tuple):  # If it's a valid tuple
-        results.append((comment, result[0], result[1]))
-    else:  # If it's an error message
-        print(f"Error processing comment: {result}")
-        results.append((comment, None, None))
-
-# Save results to a CSV
-output_df = pd.DataFrame(results, columns=["comment", "Humor Intent", "Commenter's Amusement"])
-output_df.to_csv("labeled_humor.csv", index=False)
+    # Save results to a CSV, merged with the labels of earlier runs
+    output_df = pd.DataFrame(results, columns=["comment", "Humor Intent", "Commenter's Amusement"])
+    output_df[ID_COLUMN] = df[ID_COLUMN].to_numpy()
+    write_dataset(output_df, manifest.delta_path)
+    print(f"Labeled {manifest.merge()} new or changed comments")
@@ -1,10 +1,17 @@
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pandas as pd
 
-# Load the data with sentiment scores
-file_name = "data_with_sentiment_scores.xlsx"  # Replace with your actual file name
-data = pd.read_excel(file_name)
+from dataset_io import resolve_input
+from summary_stats import StreamingHistogram, summarize
+
+BINS = 20
+
+# Bin the sentiment score columns in one chunked pass, so the corpus never has to fit in memory
+file_name = resolve_input("data_with_sentiment_scores")  # Replace with your actual file name
+histograms = summarize(file_name, {"neg": StreamingHistogram(0, 1),
+                                   "neu": StreamingHistogram(0, 1),
+                                   "pos": StreamingHistogram(0, 1),
+                                   "compound": StreamingHistogram(-1, 1)})
 
 # Configure the visualization
 plt.rcParams['font.size'] = 16
@@ -12,15 +19,13 @@ plt.rcParams['font.size'] = 16
 # Create subplots
 fig, axs = plt.subplots(1, 4, figsize=(22, 5), sharey=True)
 
-# Set y-limit for uniformity
-plt.ylim(0, 40)
+# The shared y-axis keeps the panels uniform and scales with the corpus
 axs[0].set_ylabel('Number of texts')
 
-# Plot histograms for each sentiment score
-sns.histplot(data=data, x="neg", color='r', bins=20, ax=axs[0])
-sns.histplot(data=data, x="neu", color='grey', bins=20, ax=axs[1])
-sns.histplot(data=data, x="pos", color='g', bins=20, ax=axs[2])
-sns.histplot(data=data, x="compound", bins=20, ax=axs[3])
+# Plot the pre-binned histograms for each sentiment score
+for ax, (column, color) in zip(axs, [("neg", 'r'), ("neu", 'grey'), ("pos", 'g'), ("compound", None)]):
+    histogram = histograms[column].rebin(BINS)
+    sns.histplot(x=histogram.edges[:-1], weights=histogram.counts, bins=histogram.edges, color=color, ax=ax)
 
 # Customize axes labels
 axs[0].set(xlim=(0, 1), xlabel="Negative")
@@ -1,31 +1,42 @@
-import pandas as pd
+import numpy as np
+
+from dataset_io import EXPORT_EXCEL, DatasetWriter, export_excel, iter_dataset, resolve_input, stage_path
+from summary_stats import CategoryCounts, StreamingHistogram
+
+# Write every row with its category; the proportions and quantiles are printed either way
+SAVE_CLASSIFIED_ROWS = True
 
 # Load your dataset
-file_name = "data_with_sentiment_scores.xlsx"  # Replace with your file name
-data = pd.read_excel(file_name)
+file_name = resolve_input("data_with_sentiment_scores")  # Replace with your file name
 
 # Classify texts into positive, neutral, or negative
 def classify_sentiment(compound):
-    if compound > 0.05:
-        return 'positive'
-    elif compound < -0.05:
-        return 'negative'
-    else:
-        return 'neutral'
+    """Category of each compound score in an array; missing scores count as neutral."""
+    compound = np.asarray(compound, dtype=float)
+    return np.select([compound > 0.05, compound < -0.05], ['positive', 'negative'], 'neutral')
 
-# Apply classification based on the compound score
-data['sentiment_category'] = data['compound'].apply(classify_sentiment)
+output_file = stage_path("sentiment_classification_results")
+categories = CategoryCounts('sentiment_category')
+compound = StreamingHistogram(-1, 1)
 
-# Calculate proportions of each sentiment category
-total_texts = len(data)
-proportions = data['sentiment_category'].value_counts(normalize=True)  # Normalize=True gives proportions
+# Classify, count and save chunk by chunk in a single pass over the file
+with DatasetWriter(output_file) as writer:
+    for data in iter_dataset(file_name, columns=None if SAVE_CLASSIFIED_ROWS else ['compound']):
+        scores = data['compound'].to_numpy(dtype=float, na_value=np.nan)
+        data['sentiment_category'] = classify_sentiment(scores)
+        categories.update(data['sentiment_category'])
+        compound.update(scores)
+        if SAVE_CLASSIFIED_ROWS:
+            writer.write(data)
 
-# Save the updated data with sentiment categories
-output_file = "sentiment_classification_results.xlsx"
-data.to_excel(output_file, index=False)
+if SAVE_CLASSIFIED_ROWS and EXPORT_EXCEL:
+    export_excel(output_file)
 
 # Print the proportions
 print("Proportions of Sentiment Categories:")
-print(proportions)
+print(categories.proportions())
+quartiles = compound.quantile([0.25, 0.5, 0.75])
+print(f"Compound score quartiles: {quartiles[0]:.3f} / {quartiles[1]:.3f} / {quartiles[2]:.3f}")
 
-print(f"Sentiment classification results saved to {output_file}.")
+if SAVE_CLASSIFIED_ROWS:
+    print(f"Sentiment classification results saved to {output_file}.")
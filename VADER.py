@@ -1,31 +1,66 @@
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from tqdm import tqdm
 
-# Load the Excel file
-file_name = "final.xlsx"  # Replace with your file name
-data = pd.read_excel(file_name)
+from dataset_io import EXPORT_EXCEL, DatasetWriter, export_excel, iter_dataset, resolve_input, stage_path
+from incremental import StageManifest
 
-# Initialize the VADER Sentiment Analyzer
+# Score columns in the order VADER returns them
+SCORE_COLUMNS = ["neg", "neu", "pos", "compound"]
+BATCH_SIZE = 2_000   # texts scored per worker task
+NUM_WORKERS = None   # defaults to the number of cores
+
+# Initialize the VADER Sentiment Analyzer (each worker process gets its own)
 analyzer = SentimentIntensityAnalyzer()
 
-# Define a function to compute sentiment scores
-def compute_sentiment(text):
-    if pd.isna(text):  # Handle missing values
-        return {"pos": None, "neu": None, "neg": None, "compound": None}
-    scores = analyzer.polarity_scores(text)
+
+def score_texts(texts):
+    """Score a batch of texts into an (n, 4) float array of neg/neu/pos/compound; missing texts stay NaN."""
+    scores = np.full((len(texts), len(SCORE_COLUMNS)), np.nan)
+    for i, text in enumerate(texts):
+        if pd.isna(text):  # Handle missing values
+            continue
+        result = analyzer.polarity_scores(text)
+        for j, column in enumerate(SCORE_COLUMNS):
+            scores[i, j] = result[column]
     return scores
 
-# Apply the function to the "Text" column with tqdm
-tqdm.pandas(desc="Computing Sentiment Scores")  # Initialize tqdm
-sentiment_scores = data["Text"].progress_apply(compute_sentiment)
 
-# Convert sentiment scores to separate columns
-scores_df = pd.DataFrame(sentiment_scores.tolist())
-data_with_scores = pd.concat([data, scores_df], axis=1)
+def score_column(texts, pool):
+    """Split a column of texts across the pool and gather the scores into one preallocated array."""
+    texts = list(texts)
+    scores = np.empty((len(texts), len(SCORE_COLUMNS)))
+    starts = range(0, len(texts), BATCH_SIZE)
+    batches = pool.map(score_texts, [texts[start:start + BATCH_SIZE] for start in starts])
+    for start, batch_scores in zip(starts, batches):
+        scores[start:start + len(batch_scores)] = batch_scores
+    return scores
+
+
+if __name__ == '__main__':
+    # Load the data (final.parquet, or a legacy final.xlsx)
+    file_name = resolve_input("final")  # Replace with your file name
+    output_file = stage_path("data_with_sentiment_scores")
+    # Rows scored by earlier runs are skipped; only new or edited rows are scored
+    manifest = StageManifest(output_file)
+
+    # Stream the file through the pool chunk by chunk
+    with ProcessPoolExecutor(max_workers=NUM_WORKERS) as pool, \
+            DatasetWriter(manifest.delta_path) as writer:
+        progress = tqdm(desc="Computing Sentiment Scores", unit=" rows")
+        for data in manifest.new_rows(iter_dataset(file_name)):
+            scores = score_column(data["Text"], pool)
+            scores_df = pd.DataFrame(scores, columns=SCORE_COLUMNS, index=data.index)
+            writer.write(pd.concat([data, scores_df], axis=1))
+            progress.update(len(data))
+        progress.close()
+
+    # Merge the new scores into the results of earlier runs
+    scored = manifest.merge()
 
-# Save the results to a new Excel file
-output_file = "data_with_sentiment_scores.xlsx"
-data_with_scores.to_excel(output_file, index=False)
+    if EXPORT_EXCEL:
+        export_excel(output_file)
 
-print(f"Sentiment analysis complete! Results saved to {output_file}.")
+    print(f"Sentiment analysis complete! Scored {scored} new or changed rows, results saved to {output_file}.")
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+DAY = 86_400
+# Windows around the join date, in days, counted next to the plain before/after totals
+WINDOWS_DAYS = (30, 90, 365)
+
+
+def window_columns(windows=WINDOWS_DAYS):
+    return [f"{kind}_{side}_{days}d" for days in windows for side in ("before", "after")
+            for kind in ("posts", "comments")]
+
+
+def join_window_counts(events, anchor, target, windows=WINDOWS_DAYS):
+    """Count every author's posts and comments in target before and after they joined anchor.
+
+    events is a flat table with author, subreddit, created_utc and is_post columns, and
+    an author's join date is their first activity in anchor. Returns one row per
+    author, indexed by author, with join_utc (NaN for authors never active in anchor),
+    posts and comments in target, posts/comments_before and posts/comments_after, and
+    for every window of d days the same four counts limited to d days around the join.
+    An event at the exact join time counts as after.
+
+    Events are sorted once on an (author, time) key, so every count for every author
+    and window is a difference of two searchsorted positions.
+    """
+    codes, authors = pd.factorize(events["author"])
+    n_authors = len(authors)
+    subreddits = events["subreddit"].astype(str).str.lower().to_numpy()
+    created_utc = events["created_utc"].to_numpy(np.int64)
+    is_post = events["is_post"].to_numpy(bool)
+
+    # key = author * span + time offset; offsets stay inside [0, span), so authors never overlap
+    base = created_utc.min() - 1 if len(created_utc) else 0
+    span = (created_utc.max() - base + 2) if len(created_utc) else 2
+    author_start = np.arange(n_authors, dtype=np.int64) * span
+
+    def sorted_keys(mask):
+        return np.sort(codes[mask].astype(np.int64) * span + (created_utc[mask] - base))
+
+    def key(times):
+        return author_start + np.clip(times - base, 0, span - 1)
+
+    # Join date: the first anchor key of every author
+    anchor_keys = sorted_keys(subreddits == anchor.lower())
+    first = np.searchsorted(anchor_keys, author_start)
+    first_key = anchor_keys[np.minimum(first, len(anchor_keys) - 1)] if len(anchor_keys) else author_start
+    joined = (first < len(anchor_keys)) & (first_key < author_start + span)
+    join = np.where(joined, first_key - author_start + base, 0)
+
+    counts = {}
+    in_target = subreddits == target.lower()
+    for kind, mask in (("posts", in_target & is_post), ("comments", in_target & ~is_post)):
+        keys = sorted_keys(mask)
+        start = np.searchsorted(keys, author_start)
+
+        def before(times):
+            return np.where(joined, np.searchsorted(keys, key(times)) - start, 0)
+
+        counts[kind] = np.searchsorted(keys, author_start + span) - start
+        at_join = before(join)
+        counts[f"{kind}_before"] = at_join
+        counts[f"{kind}_after"] = np.where(joined, counts[kind] - at_join, 0)
+        for days in windows:
+            counts[f"{kind}_before_{days}d"] = at_join - before(join - days * DAY)
+            counts[f"{kind}_after_{days}d"] = before(join + days * DAY) - at_join
+
+    columns = ["posts", "comments", "posts_before", "comments_before", "posts_after", "comments_after"]
+    result = pd.DataFrame({"join_utc": np.where(joined, join, np.nan)}, index=pd.Index(authors, name="author"))
+    for column in columns + window_columns(windows):
+        result[column] = counts[column]
+    return result
@@ -0,0 +1 @@
+# Run the scripts from the repository root, e.g. python -m arcticshift.preprocess
@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from arcticshift.store import STORE_DIR, open_dataset, read_columns
+
+INDEX_DIR = "author_index"
+
+
+def _timeline_path(subreddit_name, root):
+    return os.path.join(root, f"subreddit={subreddit_name}.npz")
+
+
+def _encode(author_ids, created_utc, is_post):
+    """Sort events by author then time and delta-encode each author's timestamps.
+
+    The first timestamp of an author is kept in "first"; the rest are stored as gaps
+    to the previous event, which fit in uint32 and compress well.
+    """
+    order = np.lexsort((created_utc, author_ids))
+    author_ids, created_utc, is_post = author_ids[order], created_utc[order], is_post[order]
+    authors, starts, counts = np.unique(author_ids, return_index=True, return_counts=True)
+    deltas = np.diff(created_utc, prepend=created_utc[:1])
+    deltas[starts] = 0
+    return {"authors": authors.astype(np.int32),
+            "offsets": np.append(starts, len(created_utc)).astype(np.int64),
+            "first": created_utc[starts],
+            "deltas": deltas.astype(np.uint32),
+            "is_post": is_post}
+
+
+class Timeline:
+    """Sorted event times of every author of one subreddit, in CSR layout.
+
+    Author authors[i] has the events timestamps[offsets[i]:offsets[i + 1]], oldest first.
+    """
+
+    def __init__(self, authors, offsets, first, deltas, is_post):
+        self.authors = authors
+        self.offsets = offsets
+        self.counts = np.diff(offsets)
+        # Undo the delta encoding with one cumulative sum, restarted at every author
+        values = deltas.astype(np.int64)
+        values[offsets[:-1]] = first
+        totals = np.cumsum(values)
+        self.timestamps = totals - np.repeat(totals[offsets[:-1]] - first, self.counts)
+        self.is_post = is_post
+
+    def positions(self, author_ids):
+        """Row of each author id in this timeline, -1 where the author never posted here."""
+        if not len(self.authors):
+            return np.full(len(author_ids), -1)
+        rows = np.minimum(np.searchsorted(self.authors, author_ids), len(self.authors) - 1)
+        return np.where(self.authors[rows] == author_ids, rows, -1)
+
+
+class AuthorIndex:
+    """Offline author -> subreddit index over the Arctic Shift store.
+
+    Every subreddit keeps the sorted, delta-encoded timestamps of each author's posts
+    and comments in a compressed .npz file, next to one shared author vocabulary, so
+    overlap, first-activity and before/after-join questions are answered from local
+    arrays without touching Reddit.
+    """
+
+    def __init__(self, root=INDEX_DIR):
+        self.root = root
+        self.vocabulary = pq.read_table(os.path.join(root, "authors.parquet"))["author"]
+        self.timelines = {}
+
+    @staticmethod
+    def build(subreddits=None, store_root=STORE_DIR, root=INDEX_DIR):
+        """Build the index for the given subreddits (default: all of them) from the store."""
+        if subreddits is None:
+            subreddits = sorted(pc.unique(open_dataset(store_root).to_table(columns=["subreddit"])["subreddit"])
+                                .to_pylist())
+        os.makedirs(root, exist_ok=True)
+        tables = {subreddit_name: read_columns(["author", "created_utc", "is_post"], subreddits=[subreddit_name],
+                                               root=store_root)
+                  for subreddit_name in subreddits}
+        vocabulary = pc.unique(pa.chunked_array([chunk for table in tables.values() for chunk in table["author"].chunks],
+                                                type=pa.string()))
+        vocabulary = vocabulary.take(pc.sort_indices(vocabulary))
+        pq.write_table(pa.table({"author": vocabulary}), os.path.join(root, "authors.parquet"))
+        for subreddit_name, table in tables.items():
+            author_ids = pc.index_in(table["author"], value_set=vocabulary).to_numpy()
+            np.savez_compressed(_timeline_path(subreddit_name, root),
+                                **_encode(author_ids, table["created_utc"].to_numpy(),
+                                          table["is_post"].to_numpy()))
+        return AuthorIndex(root)
+
+    def timeline(self, subreddit_name):
+        """Decoded Timeline of a subreddit, loaded once and kept in memory."""
+        if subreddit_name not in self.timelines:
+            with np.load(_timeline_path(subreddit_name, self.root)) as arrays:
+                self.timelines[subreddit_name] = Timeline(**{name: arrays[name] for name in arrays.files})
+        return self.timelines[subreddit_name]
+
+    def author_ids(self, authors):
+        """Vocabulary id of each author name, -1 for authors not in the index."""
+        ids = pc.index_in(pa.array(list(authors), pa.string()), value_set=self.vocabulary)
+        return pc.fill_null(ids, -1).to_numpy()
+
+    def author_names(self, author_ids):
+        return self.vocabulary.take(pa.array(author_ids)).to_pylist()
+
+    def overlap(self, subreddit_a, subreddit_b):
+        """Authors active in both subreddits."""
+        return self.author_names(np.intersect1d(self.timeline(subreddit_a).authors,
+                                                self.timeline(subreddit_b).authors))
+
+    def first_activity(self, subreddit_name, authors=None):
+        """Series of author -> created_utc of their first post or comment in the subreddit.
+
+        Authors that never posted there are left out.
+        """
+        timeline = self.timeline(subreddit_name)
+        rows = np.arange(len(timeline.authors))
+        if authors is not None:
+            rows = timeline.positions(self.author_ids(authors))
+            rows = rows[rows >= 0]
+        return pd.Series(timeline.timestamps[timeline.offsets[rows]],
+                         index=self.author_names(timeline.authors[rows]), name="first_utc")
+
+    def activity_around_join(self, subreddit_a, subreddit_b):
+        """Posts and comments in A before and after each author's first activity in B.
+
+        Returns one row per author active in both, with join_utc and the four counts.
+        An event at the exact join time counts as after.
+        """
+        timeline_a, timeline_b = self.timeline(subreddit_a), self.timeline(subreddit_b)
+        shared = np.intersect1d(timeline_a.authors, timeline_b.authors)
+        rows_a = timeline_a.positions(shared)
+        join = timeline_b.timestamps[timeline_b.offsets[timeline_b.positions(shared)]]
+
+        # Gather the A events of the shared authors and label them with their author's row
+        counts = timeline_a.counts[rows_a]
+        starts = timeline_a.offsets[rows_a]
+        labels = np.repeat(np.arange(len(shared)), counts)
+        events = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        before = timeline_a.timestamps[events] < join[labels]
+        is_post = timeline_a.is_post[events]
+
+        def count(mask):
+            return np.bincount(labels[mask], minlength=len(shared))
+
+        return pd.DataFrame({"author": self.author_names(shared),
+                             "join_utc": join,
+                             "posts_before": count(before & is_post),
+                             "comments_before": count(before & ~is_post),
+                             "posts_after": count(~before & is_post),
+                             "comments_after": count(~before & ~is_post)})
+
+
+if __name__ == '__main__':
+    index = AuthorIndex.build()
+    print(index.activity_around_join("depression", "funny").head())
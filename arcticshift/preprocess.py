@@ -1,8 +1,24 @@
 import json
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import tqdm
 
+from arcticshift.store import STORE_DIR, PartitionWriter, clear_subreddit
+
+try:
+    from orjson import loads
+except ImportError:  # fall back to the standard library parser
+    from json import loads
+
+DUMP_DIR = r"C:\Users\erels\Downloads"
+
+# Parallel ingest settings
+PARALLEL_INGEST = True
+NUM_WORKERS = os.cpu_count()
+CHUNK_SIZE = 64 * 1024 * 1024  # bytes of JSONL handed to a worker per task
+
 
 def clean_post(post):
     # Define the fields you want to keep
@@ -26,8 +42,12 @@ def clean_comment(post):
     return post["author"], cleaned_post
 
 
+def dump_path(subreddit_name, kind):
+    return os.path.join(DUMP_DIR, f"r_{subreddit_name}_{kind}.jsonl")
+
+
 def get_from_subreddit(subreddit_name, all_data):
-    jsonl_file = rf"C:\Users\erels\Downloads\r_{subreddit_name}_posts.jsonl"
+    jsonl_file = dump_path(subreddit_name, "posts")
     with open(jsonl_file, 'r', encoding='utf-8') as file:
         for line in tqdm.tqdm(file):
             data = json.loads(line)
@@ -35,7 +55,7 @@ def get_from_subreddit(subreddit_name, all_data):
             if out:
                 all_data[out[0]][subreddit_name].append(out[1])
 
-    jsonl_file = rf"C:\Users\erels\Downloads\r_{subreddit_name}_comments.jsonl"
+    jsonl_file = dump_path(subreddit_name, "comments")
     # Open the file and load each line as a JSON object
     with open(jsonl_file, 'r', encoding='utf-8') as file:
         for line in tqdm.tqdm(file):
@@ -45,9 +65,85 @@ def get_from_subreddit(subreddit_name, all_data):
                 all_data[out[0]][subreddit_name].append(out[1])
 
 
+def split_byte_ranges(path, chunk_size=CHUNK_SIZE):
+    """Split a JSONL file into (start, end) byte ranges that fall on line boundaries."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                # Move the cut forward to the end of the line it landed in
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _ingest_range(path, start, end, subreddit_name, kind, part_name, store_dir):
+    """Worker: clean one byte range of a dump and stream the kept records into the store."""
+    clean = clean_post if kind == "posts" else clean_comment
+    writer = PartitionWriter(subreddit_name, part_name, root=store_dir)
+    lines = kept = 0
+    with open(path, 'rb') as src:
+        src.seek(start)
+        position = start
+        while position < end:
+            line = src.readline()
+            if not line:
+                break
+            lines += 1
+            if not line.strip():
+                position += len(line)
+                continue
+            result = clean(loads(line))
+            if result:
+                result[1]["position"] = position
+                writer.append(*result)
+                kept += 1
+            position += len(line)
+    writer.close()
+    return lines, kept
+
+
+def get_from_subreddit_parallel(subreddit_name, store_dir=STORE_DIR, workers=NUM_WORKERS):
+    """Ingest a subreddit's posts and comments dumps with a process pool.
+
+    Both dumps are cut into byte ranges and every range is cleaned by a worker that
+    writes its own Parquet files into the subreddit's partitions of the columnar store,
+    so memory stays flat no matter how big the dump is. The per-worker counts are
+    merged into the returned summary.
+    """
+    clear_subreddit(subreddit_name, store_dir)
+
+    tasks = []
+    for kind in ("posts", "comments"):
+        path = dump_path(subreddit_name, kind)
+        for i, (start, end) in enumerate(split_byte_ranges(path)):
+            tasks.append((path, start, end, subreddit_name, kind, f"{kind}-{i:05d}", store_dir))
+
+    summary = {"lines": 0, "kept": 0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_ingest_range, *task) for task in tasks]
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures),
+                                desc=f"Ingesting r/{subreddit_name}"):
+            lines, kept = future.result()
+            summary["lines"] += lines
+            summary["kept"] += kept
+    return summary
+
+
 if __name__ == '__main__':
-    all_data = defaultdict(lambda: defaultdict(list))
-    get_from_subreddit("funny", all_data)
-    get_from_subreddit("depression", all_data)
+    if PARALLEL_INGEST:
+        for subreddit_name in ("funny", "depression"):
+            summary = get_from_subreddit_parallel(subreddit_name)
+            print(f"r/{subreddit_name}: kept {summary['kept']} of {summary['lines']} lines")
+    else:
+        all_data = defaultdict(lambda: defaultdict(list))
+        get_from_subreddit("funny", all_data)
+        get_from_subreddit("depression", all_data)
 
-    json.dump(all_data, open("cleaned_data.json", "w"))
+        json.dump(all_data, open("cleaned_data.json", "w"))
@@ -1,30 +1,90 @@
 import json
+import os
+
+import numpy as np
 import pandas as pd
-import tqdm
 
-if __name__ == '__main__':
-    with open("cleaned_data.json", "r") as file:
+from arcticshift.store import STORE_DIR, open_dataset, read_columns
+
+SUBREDDITS = ["funny", "depression"]
+
+
+def load_events(subreddits=SUBREDDITS, root=STORE_DIR):
+    """Flat author/subreddit/created_utc/is_post/order table read from the columnar store.
+
+    order ranks events the way the dumps were read: subreddit by subreddit, the posts
+    dump before the comments dump, then line position in the dump. Stores written
+    before positions were recorded fall back to created_utc for the line position.
+    """
+    columns = ["author", "subreddit", "created_utc", "is_post"]
+    has_position = "position" in open_dataset(root).schema.names
+    table = read_columns(columns + (["position"] if has_position else []), subreddits=subreddits, root=root)
+    events = table.to_pandas()
+    events["author"] = events["author"].astype("category")
+    events["subreddit"] = events["subreddit"].astype(str).astype(pd.CategoricalDtype(subreddits))
+
+    dump_rank = events["subreddit"].cat.codes.to_numpy(np.int64) * 2 + (~events["is_post"].to_numpy()).astype(np.int64)
+    position = events.pop("position") if has_position else events["created_utc"]
+    events["order"] = (dump_rank << 40) + position.to_numpy(np.int64)
+    return events
+
+
+def load_events_from_json(path="cleaned_data.json"):
+    """Flatten the legacy user -> subreddit -> records JSON into the same event table.
+
+    Users are stored in the order the dumps were read, so order is the row number.
+    """
+    with open(path, "r") as file:
         data = json.load(file)
+    rows = [(user, subreddit_name, int(float(record["created_utc"])), record["is_post"])
+            for user, user_data in data.items()
+            for subreddit_name, records in user_data.items()
+            for record in records]
+    events = pd.DataFrame(rows, columns=["author", "subreddit", "created_utc", "is_post"])
+    events["order"] = np.arange(len(events), dtype=np.int64)
+    return events
+
+
+def aggregate_activity(events, subreddits=SUBREDDITS):
+    """Per-user activity for every subreddit in one group-by pass.
+
+    Returns one row per user (in the order users first appear in the dumps, by the
+    events' order column) with count_<sub>, posts_<sub>, comments_<sub>, first_<sub>
+    and last_<sub> columns. Users missing from a subreddit get zero counts and empty
+    first/last timestamps.
+    """
+    events = events[events["subreddit"].isin(subreddits)]
+    grouped = events.groupby(["author", "subreddit"], sort=False, observed=True)
+    stats = grouped.agg(count=("created_utc", "size"),
+                        posts=("is_post", "sum"),
+                        first=("created_utc", "min"),
+                        last=("created_utc", "max"))
+    stats["comments"] = stats["count"] - stats["posts"]
+
+    stats = stats.reset_index()
+    stats["subreddit"] = stats["subreddit"].astype(str)
+    wide = stats.pivot(index="author", columns="subreddit")
+    wide = wide.reindex(columns=pd.MultiIndex.from_product([["count", "posts", "comments", "first", "last"],
+                                                            subreddits]))
+    for stat in ("count", "posts", "comments"):
+        wide[stat] = wide[stat].fillna(0).astype(np.int64)
+    wide.columns = [f"{stat}_{subreddit_name}" for stat, subreddit_name in wide.columns]
+
+    # Order users by their first event in dump order, as the legacy JSON listed them
+    order = events["order"].groupby(events["author"], sort=False, observed=True).min().sort_values(kind="stable")
+    wide = wide.loc[order.index]
+
+    wide.index = wide.index.astype(str)
+    wide.index.name = "user"
+    return wide.reset_index()
+
+
+if __name__ == '__main__':
+    if os.path.isdir(STORE_DIR):
+        events = load_events()
+    else:
+        events = load_events_from_json()
 
-    processed_data = []
-    for user in tqdm.tqdm(data, desc="Processing users"):
-        """
-        For every user keep:
-        -  count the number of posts per reddit
-        """
-        user_data = data[user]
-        if "funny" not in user_data:
-            user_data["funny"] = []
-        if "depression" not in user_data:
-            user_data["depression"] = []
-        count_funny = len(user_data["funny"])
-        count_depression = len(user_data["depression"])
-
-        processed_data.append({"user": user,
-                               "count_funny": count_funny,
-                               "count_depression": count_depression,
-                               })
-
-    df = pd.DataFrame(processed_data)
-
-    df.to_csv("user_activity.csv", index=False)
+    activity = aggregate_activity(events)
+    activity[["user"] + [f"count_{subreddit_name}" for subreddit_name in SUBREDDITS]].to_csv("user_activity.csv", index=False)
+    activity.to_csv("user_activity_detailed.csv", index=False)
@@ -0,0 +1,142 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Columns of collected Reddit posts and comments (user_comments_and_posts and friends)
+ITEM_SCHEMA = pa.schema([
+    ("Username", pa.dictionary(pa.int32(), pa.string())),
+    ("Text", pa.large_string()),
+    ("Date", pa.timestamp("s")),
+    ("Subreddit", pa.dictionary(pa.int32(), pa.string())),
+    ("Type", pa.dictionary(pa.int32(), pa.string())),
+    ("Link", pa.large_string()),
+])
+
+class StringColumn:
+    """Strings packed into one UTF-8 buffer plus an offsets array, Arrow's string layout."""
+
+    def __init__(self, large=False):
+        self.type = pa.large_string() if large else pa.string()
+        self.data = bytearray()
+        self.offsets = array("q" if large else "i", [0])
+        self.nulls = []
+
+    def append(self, value):
+        if value is None:
+            self.nulls.append(len(self.offsets) - 1)
+        else:
+            self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def to_arrow(self):
+        length = len(self.offsets) - 1
+        validity = None
+        if self.nulls:
+            valid = np.ones(length, dtype=bool)
+            valid[self.nulls] = False
+            validity = pa.py_buffer(np.packbits(valid, bitorder="little"))
+        return pa.Array.from_buffers(self.type, length, [validity, pa.py_buffer(self.offsets),
+                                                         pa.py_buffer(self.data)], null_count=len(self.nulls))
+
+
+class CodeColumn:
+    """Repeated strings (authors, subreddits, types) interned once and stored as int32 codes."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.pool = {}
+
+    def append(self, value):
+        code = self.pool.get(value)
+        if code is None:
+            code = self.pool[value] = len(self.pool)
+        self.codes.append(code)
+
+    def to_arrow(self):
+        indices = pa.Array.from_buffers(pa.int32(), len(self.codes), [None, pa.py_buffer(self.codes)])
+        return pa.DictionaryArray.from_arrays(indices, pa.array(list(self.pool), pa.string()))
+
+
+class NumberColumn:
+    """Fixed-width numbers (or seconds-resolution timestamps) in one typed array."""
+
+    TYPECODES = {pa.int64(): "q", pa.int32(): "i", pa.float64(): "d", pa.timestamp("s"): "q"}
+
+    def __init__(self, type):
+        self.type = type
+        self.values = array(self.TYPECODES[type])
+
+    def append(self, value):
+        self.values.append(value)
+
+    def to_arrow(self):
+        return pa.Array.from_buffers(self.type, len(self.values), [None, pa.py_buffer(self.values)])
+
+
+class FlagColumn:
+    """Booleans kept one byte each while collecting and bit-packed on conversion."""
+
+    def __init__(self):
+        self.values = bytearray()
+
+    def append(self, value):
+        self.values.append(1 if value else 0)
+
+    def to_arrow(self):
+        flags = np.frombuffer(self.values, dtype=np.uint8).astype(bool)
+        return pa.Array.from_buffers(pa.bool_(), len(flags), [None, pa.py_buffer(np.packbits(flags, bitorder="little"))])
+
+
+def _column_for(field_type):
+    if pa.types.is_dictionary(field_type):
+        return CodeColumn()
+    if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+        return StringColumn(large=pa.types.is_large_string(field_type))
+    if pa.types.is_boolean(field_type):
+        return FlagColumn()
+    return NumberColumn(field_type)
+
+
+class RecordBuffer:
+    """Collected posts and comments held column by column in compact typed buffers.
+
+    Each record costs its raw bytes instead of a dict or list of Python objects:
+    numbers and timestamps sit in typed arrays, texts in one UTF-8 buffer with
+    offsets, and repeated strings (dictionary fields of the schema) as int32 codes.
+    to_arrow() wraps the buffers without copying them (flags are bit-packed), and
+    to_pandas() returns an Arrow-backed DataFrame over the same memory, with the
+    interned fields as Categoricals. Appending again after a conversion raises
+    BufferError while the Arrow data is alive.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = [_column_for(field.type) for field in schema]
+        self.length = 0
+
+    def append(self, *values):
+        """Append one record, with values in schema order."""
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def to_arrow(self):
+        return pa.Table.from_arrays([column.to_arrow() for column in self.columns], schema=self.schema)
+
+    def to_pandas(self):
+        return table_to_pandas(self.to_arrow())
+
+
+def _arrow_dtype(field_type):
+    # Dictionary fields become pandas Categoricals, which round-trip through Parquet
+    return None if pa.types.is_dictionary(field_type) else pd.ArrowDtype(field_type)
+
+
+def table_to_pandas(table):
+    """Arrow-backed DataFrame over a table of records (e.g. concatenated RecordBuffer tables)."""
+    return table.to_pandas(types_mapper=_arrow_dtype)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import zlib
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from arcticshift.records import RecordBuffer
+
+STORE_DIR = "cleaned_store"
+N_BUCKETS = 16
+BATCH_ROWS = 200_000  # rows buffered per writer before flushing to Parquet
+
+# Columns kept for every post and comment
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("author", pa.string()),
+    ("created_utc", pa.int64()),
+    ("is_post", pa.bool_()),
+    ("title", pa.string()),
+    ("body", pa.string()),
+    ("position", pa.int64()),  # byte offset of the record's line in its dump, to recover the dump order
+])
+
+
+def author_bucket(author, n_buckets=N_BUCKETS):
+    """Stable hash partition of an author (Python's hash() changes between runs)."""
+    return zlib.crc32(author.encode('utf-8')) % n_buckets
+
+
+def subreddit_dir(subreddit_name, root=STORE_DIR):
+    return os.path.join(root, f"subreddit={subreddit_name}")
+
+
+def clear_subreddit(subreddit_name, root=STORE_DIR):
+    """Drop a subreddit's partitions before it is ingested again."""
+    shutil.rmtree(subreddit_dir(subreddit_name, root), ignore_errors=True)
+
+
+class PartitionWriter:
+    """Buffer cleaned records per author bucket and flush them as Parquet files.
+
+    Files land in root/subreddit=<name>/bucket=<k>/<part_name>-<n>.parquet, so each
+    worker of the parallel ingest can write its own files without coordination.
+    """
+
+    def __init__(self, subreddit_name, part_name, root=STORE_DIR, n_buckets=N_BUCKETS, batch_rows=BATCH_ROWS):
+        self.subreddit_name = subreddit_name
+        self.part_name = part_name
+        self.root = root
+        self.n_buckets = n_buckets
+        self.batch_rows = batch_rows
+        self.buffers = {}
+        self.buffered = 0
+        self.flushes = 0
+
+    def append(self, author, record):
+        bucket = author_bucket(author, self.n_buckets)
+        records = self.buffers.get(bucket)
+        if records is None:
+            records = self.buffers[bucket] = RecordBuffer(SCHEMA)
+        records.append(record["id"], author, int(float(record["created_utc"])), record["is_post"],
+                       record["title"], record["body"], record.get("position", -1))
+        self.buffered += 1
+        if self.buffered >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        for bucket, records in self.buffers.items():
+            bucket_dir = os.path.join(subreddit_dir(self.subreddit_name, self.root), f"bucket={bucket}")
+            os.makedirs(bucket_dir, exist_ok=True)
+            pq.write_table(records.to_arrow(), os.path.join(bucket_dir, f"{self.part_name}-{self.flushes:04d}.parquet"),
+                           compression="zstd")
+        self.buffers = {}
+        self.buffered = 0
+        self.flushes += 1
+
+    def close(self):
+        if self.buffered:
+            self.flush()
+
+
+def open_dataset(root=STORE_DIR):
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def read_columns(columns, subreddits=None, buckets=None, root=STORE_DIR):
+    """Read only the requested columns of the requested partitions as an Arrow table.
+
+    The partition keys "subreddit" and "bucket" can be asked for like any other column.
+    Subreddits are matched case-insensitively, like Reddit does.
+    """
+    dataset = open_dataset(root)
+    condition = None
+    if subreddits is not None:
+        condition = pc.utf8_lower(ds.field("subreddit")).isin([name.lower() for name in subreddits])
+    if buckets is not None:
+        bucket_condition = ds.field("bucket").isin(list(buckets))
+        condition = bucket_condition if condition is None else condition & bucket_condition
+    return dataset.to_table(columns=list(columns), filter=condition)
+
+
+def count_posts_per_user(subreddits, root=STORE_DIR):
+    """Count posts and comments per author for each subreddit using only the author column."""
+    counts = {}
+    for subreddit_name in subreddits:
+        authors = read_columns(["author"], subreddits=[subreddit_name], root=root)["author"]
+        value_counts = pc.value_counts(authors).flatten()
+        counts[subreddit_name] = dict(zip(value_counts[0].to_pylist(), value_counts[1].to_pylist()))
+    return counts
@@ -0,0 +1,79 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 16         # submissions whose trees are fetched at the same time
+MORE_BUDGET = 0          # /api/morechildren calls per submission; 0 drops "load more" stubs like replace_more(limit=0)
+MORE_CHILDREN_BATCH = 100  # the most comment ids Reddit expands in one call
+TREE_LIMIT = 500         # comments Reddit returns in the first response of a tree
+
+
+def author_name(item):
+    """Author of a submission or comment, or None for deleted accounts."""
+    author = item.get("author")
+    return None if not author or author == "[deleted]" else author
+
+
+def _flatten(children, comments, more_ids):
+    """Append the comments of a tree to comments in depth-first order and collect "load more" ids."""
+    for child in children:
+        if child["kind"] == "t1":
+            comments.append(child["data"])
+            replies = child["data"].get("replies")
+            if replies:
+                _flatten(replies["data"]["children"], comments, more_ids)
+        elif child["kind"] == "more":
+            # "Continue this thread" stubs carry no ids and are left alone
+            more_ids.extend(child["data"].get("children", []))
+
+
+def fetch_tree(client, submission_id, more_budget=MORE_BUDGET, depth=None):
+    """Fetch the comments of one submission as a flat list of comment dicts.
+
+    Up to more_budget /api/morechildren calls expand the "load more" stubs, up to
+    MORE_CHILDREN_BATCH comments each; depth limits how deep Reddit walks the tree.
+    """
+    params = {"limit": TREE_LIMIT, "raw_json": 1}
+    if depth is not None:
+        params["depth"] = depth
+    listing = client.get(f"/comments/{submission_id}", params=params)
+    comments, more_ids = [], []
+    _flatten(listing[1]["data"]["children"], comments, more_ids)
+
+    for _ in range(more_budget):
+        if not more_ids:
+            break
+        batch, more_ids = more_ids[:MORE_CHILDREN_BATCH], more_ids[MORE_CHILDREN_BATCH:]
+        response = client.get("/api/morechildren", params={
+            "api_type": "json", "link_id": f"t3_{submission_id}", "children": ",".join(batch), "raw_json": 1})
+        # Expanded comments come back as one flat list, nested replies included
+        _flatten(response["json"]["data"]["things"], comments, more_ids)
+    return comments
+
+
+def _fetch_or_report(client, submission, more_budget, depth):
+    try:
+        return fetch_tree(client, submission["id"], more_budget, depth)
+    except Exception as e:
+        print(f"Error processing comments for submission {submission['id']}: {e}")
+        return []
+
+
+def iter_comment_trees(client, submissions, workers=MAX_WORKERS, more_budget=MORE_BUDGET, depth=None):
+    """Fetch the comment trees of many submissions concurrently.
+
+    submissions is an iterable of submission dicts (e.g. from client.listing) and is
+    consumed lazily; a few trees per worker are in flight at a time. Yields
+    (submission, comments) in the order of submissions. A tree that fails to load
+    is reported and yields no comments.
+    """
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for submission in submissions:
+            in_flight.append((submission, pool.submit(_fetch_or_report, client, submission, more_budget, depth)))
+            if len(in_flight) >= 2 * workers:
+                submission, future = in_flight.popleft()
+                yield submission, future.result()
+        while in_flight:
+            submission, future = in_flight.popleft()
+            yield submission, future.result()
+
@@ -0,0 +1,112 @@
+import json
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from dataset_io import ExcelChunkWriter
+
+EXPORT_CHUNK = 10_000  # journal rows turned into a DataFrame at a time when exporting
+DATETIME_KEY = "__datetime__"  # marks a datetime stored as an ISO string
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    return str(value)
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and DATETIME_KEY in obj:
+        return datetime.fromisoformat(obj[DATETIME_KEY])
+    return obj
+
+
+def dumps(value):
+    """JSON for the journal; datetimes are tagged so loads() gives them back as datetimes."""
+    return json.dumps(value, default=_encode_value)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode_object)
+
+
+class CrawlJournal:
+    """Append-only SQLite journal of a crawl, so a restart skips the work already done.
+
+    It keeps three things: named cursors (e.g. how far the subreddit listing got),
+    the candidate users collected so far, and one entry per finished user with its
+    result. Every write is committed immediately, so a crash loses at most the item
+    that was in flight.
+    """
+
+    def __init__(self, path="crawl_journal.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cursors (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS candidates (username TEXT PRIMARY KEY, data TEXT);
+            CREATE TABLE IF NOT EXISTS results (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                username TEXT UNIQUE, result TEXT);
+        """)
+        self.conn.commit()
+
+    def get_cursor(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM cursors WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def save_progress(self, cursor_name, cursor_value, candidates):
+        """Store updated candidates and move the cursor past them in one transaction."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO candidates (username, data) VALUES (?, ?)",
+                                  [(username, dumps(data)) for username, data in candidates.items()])
+            self.conn.execute("INSERT OR REPLACE INTO cursors (name, value) VALUES (?, ?)",
+                              (cursor_name, json.dumps(cursor_value)))
+
+    def load_candidates(self):
+        return {username: loads(data)
+                for username, data in self.conn.execute("SELECT username, data FROM candidates")}
+
+    def finished_users(self):
+        return {username for (username,) in self.conn.execute("SELECT username FROM results")}
+
+    def record_result(self, username, result):
+        """Mark a user as done; result may be None when the user produced no row."""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results (username, result) VALUES (?, ?)",
+                              (username, None if result is None else dumps(result)))
+
+    def iter_results(self):
+        for (result,) in self.conn.execute("SELECT result FROM results WHERE result IS NOT NULL ORDER BY seq"):
+            yield loads(result)
+
+    def iter_result_frames(self, columns, chunk_size=EXPORT_CHUNK):
+        """Stream the finished results as DataFrames of at most chunk_size rows."""
+        chunk = []
+        for result in self.iter_results():
+            chunk.append(result)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+
+    def export_csv(self, path, columns):
+        header = True
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            for frame in self.iter_result_frames(columns):
+                frame.to_csv(file, header=header, index=False)
+                header = False
+            if header:
+                pd.DataFrame(columns=columns).to_csv(file, index=False)
+
+    def export_excel(self, path, columns):
+        # Write-only workbooks stream rows to disk instead of keeping the sheet in memory
+        with ExcelChunkWriter(path) as writer:
+            writer.write(pd.DataFrame(columns=columns))
+            for frame in self.iter_result_frames(columns):
+                writer.write(frame)
+
+    def close(self):
+        self.conn.close()
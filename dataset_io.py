@@ -0,0 +1,317 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from openpyxl import Workbook, load_workbook
+
+CHUNK_ROWS = 50_000
+
+# Format the stages hand data to each other in; Excel is only written as a final report
+DATA_FORMAT = ".parquet"
+EXPORT_EXCEL = False
+# Looked for, in order, when a stage's input is resolved; .xlsx keeps old outputs readable
+INPUT_FORMATS = (".parquet", ".feather", ".csv", ".xlsx")
+
+
+def stage_path(stem):
+    """Output path of a stage in the interchange format, e.g. "final" -> "final.parquet"."""
+    return stem + DATA_FORMAT
+
+
+def resolve_input(stem):
+    """First existing file for a stage name, trying the binary formats before the legacy ones."""
+    for suffix in INPUT_FORMATS:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    raise FileNotFoundError(f"No {'/'.join(INPUT_FORMATS)} file found for {stem}")
+
+
+def _suffix(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def read_dataset(path, columns=None):
+    """Read a whole dataset, or only some of its columns, into a DataFrame."""
+    suffix = _suffix(path)
+    if suffix == ".parquet":
+        return pq.read_table(path, columns=columns).to_pandas()
+    if suffix == ".feather":
+        return feather.read_table(path, columns=columns).to_pandas()
+    if suffix == ".csv":
+        return pd.read_csv(path, usecols=columns)
+    return pd.read_excel(path, usecols=columns)
+
+
+def iter_dataset(path, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield a dataset as DataFrames of at most chunk_rows rows, reading only the given columns."""
+    suffix = _suffix(path)
+    if suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif suffix == ".feather":
+        reader = ipc.open_file(pa.memory_map(path))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas()
+    elif suffix == ".csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+    else:
+        for chunk in read_excel_chunks(path, chunk_rows):
+            yield chunk if columns is None else chunk[columns]
+
+
+def _excel_header(cells):
+    """Column names the way pd.read_excel builds them: blank cells become "Unnamed: <i>"
+    and repeated names get ".1", ".2", ... suffixes."""
+    names, seen = [], {}
+    for i, cell in enumerate(cells):
+        name = f"Unnamed: {i}" if cell is None or cell == "" else cell
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if not count else f"{name}.{count}")
+    return names
+
+
+def read_excel_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield the first sheet of a workbook as DataFrames of at most chunk_rows rows.
+
+    The workbook is opened read-only, so rows are streamed from disk instead of the
+    whole sheet being loaded first. All-blank rows are skipped; the first other row
+    is the header, named as in pd.read_excel (e.g. "Unnamed: 0" over an index
+    column), and the columns end at its last non-blank cell. An empty sheet yields
+    nothing.
+    """
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = None
+        for row in rows:
+            if any(value is not None for value in row):
+                header = list(row)
+                break
+        if header is None:
+            return
+        while header[-1] is None:
+            header.pop()
+        columns = _excel_header(header)
+        width = len(columns)
+        chunk = []
+        for row in rows:
+            row = row[:width]
+            if all(value is None for value in row):
+                continue
+            chunk.append(row + (None,) * (width - len(row)))
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _excel_value(value):
+    if isinstance(value, (list, dict)):
+        return str(value)
+    return None if pd.isna(value) else value
+
+
+class ExcelChunkWriter:
+    """Append DataFrame chunks to a single sheet of a write-only workbook.
+
+    The first chunk's columns are the header; later chunks are aligned to it, and
+    since the sheet cannot be rewritten a chunk with new columns raises ValueError.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Sheet1")
+        self.columns = None
+
+    def write(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            self.sheet.append(self.columns)
+        new_columns = [column for column in frame.columns if column not in self.columns]
+        if new_columns:
+            raise ValueError(f"Cannot add columns {new_columns} to {self.path} after its header was written")
+        frame = frame.reindex(columns=self.columns)
+        for row in frame.itertuples(index=False):
+            self.sheet.append([_excel_value(value) for value in row])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _cast(table, schema):
+    """Table in the given schema; values of columns turned into text are written as strings
+    and columns the table does not have are filled with nulls."""
+    columns = []
+    for field in schema:
+        if field.name not in table.schema.names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        if column.type != field.type and pa.types.is_string(field.type) and not pa.types.is_null(column.type):
+            column = pa.array([None if value is None else str(value) for value in column.to_pylist()], pa.string())
+        columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _to_arrow(frame, schema=None):
+    try:
+        return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns read from spreadsheets can mix numbers and text; store those as text
+        frame = frame.copy()
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = frame[column].map(lambda value: value if pd.isna(value) else str(value))
+        return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def _decode_dictionaries(table):
+    """Table with dictionary (categorical) columns stored as their values.
+
+    Arrow IPC files allow one dictionary per column for the whole file, while every
+    chunk of categoricals brings its own.
+    """
+    fields = [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+              for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+def _merged_type(old, new):
+    """Type that holds values of both: null takes the other type, numbers widen, anything else becomes text."""
+    try:
+        return pa.unify_schemas([pa.schema([("value", old)]), pa.schema([("value", new)])],
+                                promote_options="permissive").field("value").type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+
+
+def _iter_batches(path, suffix):
+    if suffix == ".parquet":
+        yield from pq.ParquetFile(path).iter_batches(batch_size=CHUNK_ROWS)
+    else:
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+class DatasetWriter:
+    """Write DataFrame chunks to one Parquet, Feather, CSV or Excel file chosen by suffix.
+
+    The binary formats take their schema from the chunks: a column that was empty so
+    far takes the type of its first values, integers widen to floats, and values of
+    types that cannot be merged are stored as text. Columns that first show up in a
+    later chunk are added, empty for the rows before it, and columns a chunk lacks
+    are left empty. When a later chunk widens the schema, what was written so far is
+    rewritten with the wider one; CSV files are rewritten the same way for new
+    columns. Feather files store categorical columns as plain values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.suffix = _suffix(path)
+        self.writer = None
+        self.schema = None
+        self.columns = None
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.suffix == ".parquet":
+            self.writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+        else:
+            self.writer = ipc.new_file(self.path, schema)
+
+    def _widen(self, schema):
+        """Reopen the file with a wider schema, copying over the batches already written."""
+        self.writer.close()
+        written = self.path + ".widen"
+        os.replace(self.path, written)
+        self._open(schema)
+        for batch in _iter_batches(written, self.suffix):
+            self.writer.write_table(_cast(pa.Table.from_batches([batch]), schema))
+        os.remove(written)
+
+    def _widen_csv(self, columns):
+        """Rewrite the CSV written so far with more columns, copying its text as it is."""
+        written = self.path + ".widen"
+        os.replace(self.path, written)
+        header = True
+        for chunk in pd.read_csv(written, dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS):
+            chunk.reindex(columns=columns).to_csv(self.path, mode="w" if header else "a", header=header,
+                                                  index=False)
+            header = False
+        if header:
+            pd.DataFrame(columns=columns).to_csv(self.path, index=False)
+        os.remove(written)
+        self.columns = columns
+
+    def write(self, frame):
+        if self.suffix in (".parquet", ".feather"):
+            table = _to_arrow(frame)
+            if self.suffix == ".feather":
+                table = _decode_dictionaries(table)
+            if self.schema is None:
+                self._open(table.schema)
+            elif table.schema != self.schema:
+                names = table.schema.names
+                fields = [field.with_type(_merged_type(field.type, table.schema.field(field.name).type))
+                          if field.name in names else field for field in self.schema]
+                fields += [field for field in table.schema if field.name not in self.schema.names]
+                schema = pa.schema(fields, metadata=self.schema.metadata)
+                if schema != self.schema:
+                    self._widen(schema)
+            self.writer.write_table(_cast(table, self.schema))
+        elif self.suffix == ".csv":
+            if self.writer is None:
+                self.columns = list(frame.columns)
+            new_columns = [column for column in frame.columns if column not in self.columns]
+            if new_columns:
+                self._widen_csv(self.columns + new_columns)
+            frame.reindex(columns=self.columns).to_csv(self.path, mode="w" if self.writer is None else "a",
+                                                       header=self.writer is None, index=False)
+            self.writer = True
+        else:
+            if self.writer is None:
+                self.writer = ExcelChunkWriter(self.path)
+            self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None and self.writer is not True:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_dataset(frame, path):
+    with DatasetWriter(path) as writer:
+        writer.write(frame)
+
+
+def export_excel(path, excel_path=None):
+    """Optional report step: stream a finished dataset into an .xlsx file next to it."""
+    excel_path = excel_path or os.path.splitext(path)[0] + ".xlsx"
+    with ExcelChunkWriter(excel_path) as writer:
+        for chunk in iter_dataset(path):
+            writer.write(chunk)
+    return excel_path
@@ -0,0 +1,93 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from empath import Empath
+from empath.helpers import default_tokenizer
+from scipy import sparse
+
+_worker_index = None
+
+
+class EmpathIndex:
+    """Score whole corpora against Empath categories with sparse matrix products.
+
+    An inverted index maps every word of the selected categories to a column of a
+    word x category matrix. Texts are tokenized once into a document x word matrix,
+    and one product gives the hit counts of every category for every text. The
+    numbers are the same as lexicon.analyze(text, categories=...) per row.
+    """
+
+    def __init__(self, categories, lexicon=None):
+        lexicon = lexicon or Empath()
+        self.categories = list(categories)
+        self.vocabulary = {}
+        rows, cols = [], []
+        for j, category in enumerate(self.categories):
+            for word in lexicon.cats[category]:
+                rows.append(self.vocabulary.setdefault(word, len(self.vocabulary)))
+                cols.append(j)
+        # Repeated words are summed, as Empath counts a word once per listing
+        self.matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                        shape=(len(self.vocabulary), len(self.categories)))
+
+    def doc_term_matrix(self, token_lists):
+        """Document x word counts and tokens per document for tokenized texts (None = missing)."""
+        vocabulary = self.vocabulary
+        indptr = [0]
+        indices = []
+        n_tokens = np.zeros(len(token_lists))
+        for i, tokens in enumerate(token_lists):
+            if tokens is not None:
+                n_tokens[i] = len(tokens)
+                indices.extend(vocabulary[token] for token in tokens if token in vocabulary)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((np.ones(len(indices)), indices, indptr),
+                                   shape=(len(token_lists), len(vocabulary)))
+        return matrix, n_tokens
+
+    def score_tokens(self, token_lists, normalize=False):
+        """Category scores for texts tokenized by the caller; None entries give NaN rows."""
+        missing = np.array([tokens is None for tokens in token_lists], dtype=bool)
+        matrix, n_tokens = self.doc_term_matrix(token_lists)
+        scores = (matrix @ self.matrix).toarray()
+        if normalize:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = scores / n_tokens[:, None]
+            scores[n_tokens == 0] = np.nan
+        scores[missing] = np.nan
+        return pd.DataFrame(scores, columns=self.categories)
+
+    def score(self, texts, normalize=False):
+        """Category scores for a list of texts as a DataFrame; missing texts give NaN rows."""
+        token_lists = [None if pd.isna(text) else default_tokenizer(text) for text in texts]
+        return self.score_tokens(token_lists, normalize=normalize)
+
+
+def _init_worker(categories):
+    global _worker_index
+    _worker_index = EmpathIndex(categories)
+
+
+def _score_in_worker(texts, normalize):
+    return _worker_index.score(texts, normalize=normalize)
+
+
+def score_chunks(text_chunks, categories, workers=None, normalize=False):
+    """Score an iterable of text chunks in a process pool, yielding one DataFrame per chunk in order.
+
+    Only a few chunks per worker are in flight at a time, so corpora larger than
+    memory can be streamed through.
+    """
+    workers = workers or os.cpu_count()
+    max_in_flight = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(list(categories),)) as pool:
+        in_flight = deque()
+        for texts in text_chunks:
+            in_flight.append(pool.submit(_score_in_worker, list(texts), normalize))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
@@ -0,0 +1,115 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from tqdm import tqdm
+
+from VADER import SCORE_COLUMNS, score_texts
+from dataset_io import EXPORT_EXCEL, DatasetWriter, export_excel, iter_dataset, resolve_input, stage_path
+from empath_scoring import EmpathIndex
+from filterData import depression_keywords
+from incremental import StageManifest
+from keyword_matcher import compile_keywords, format_hits
+from LIWC import EMPATH_CATEGORIES
+
+_worker_scorers = None
+
+
+def tokenize(texts):
+    """Split every text once on whitespace (Empath's tokenizer); missing texts give None."""
+    return [None if pd.isna(text) else str(text).split() for text in texts]
+
+
+class VaderScorer:
+    """neg/neu/pos/compound from VADER, which needs the raw text for punctuation and capitals."""
+
+    config = None
+
+    def score(self, texts, tokens):
+        return pd.DataFrame(score_texts(texts), columns=SCORE_COLUMNS)
+
+
+class EmpathScorer:
+    """Empath category counts computed from the shared tokens."""
+
+    def __init__(self, categories=EMPATH_CATEGORIES):
+        self.index = EmpathIndex(categories)
+        self.config = list(categories)
+
+    def score(self, texts, tokens):
+        return self.index.score_tokens(tokens)
+
+
+class KeywordScorer:
+    """Keyword hits and their total, from the same regex scan filterData.py uses.
+
+    Word boundaries matter here ("depression's", "sad/tired"), so the raw text is
+    scanned instead of the whitespace tokens.
+    """
+
+    def __init__(self, keywords=depression_keywords):
+        self.matcher = compile_keywords(tuple(keywords))
+        self.config = list(keywords)
+
+    def score(self, texts, tokens):
+        # Already running inside a pool worker, so scan in this process
+        hits = self.matcher.scan(texts, workers=1)
+        return pd.DataFrame({"Keyword Hits": hits["hits"].map(format_hits).to_numpy(),
+                             "Keyword Count": hits["count"].to_numpy()})
+
+
+def score_chunk(scorers, texts):
+    """Tokenize a chunk of texts once and run every scorer on it; returns one wide DataFrame."""
+    texts = list(texts)
+    tokens = tokenize(texts)
+    return pd.concat([scorer.score(texts, tokens) for scorer in scorers], axis=1)
+
+
+def _init_worker(scorers):
+    global _worker_scorers
+    _worker_scorers = scorers
+
+
+def _score_in_worker(texts):
+    return score_chunk(_worker_scorers, texts)
+
+
+def run_pipeline(input_path, output_path, scorers, text_column="Text", workers=None):
+    """Read the corpus once in chunks, score every chunk with all scorers and write one wide table.
+
+    Chunks are scored in a process pool with a few chunks per worker in flight, and
+    written in input order next to the original columns. Only rows that are new or
+    changed since the last run are scored and merged into the existing output; the
+    scorers and their config are part of the manifest, so changing them rescores everything.
+    """
+    workers = workers or os.cpu_count()
+    manifest = StageManifest(output_path, content_column=text_column,
+                             config=[[type(scorer).__name__, scorer.config] for scorer in scorers])
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(scorers,)) as pool, \
+            DatasetWriter(manifest.delta_path) as writer, tqdm(desc="Scoring texts", unit=" rows") as progress:
+
+        def write_oldest():
+            data, future = in_flight.popleft()
+            features = future.result()
+            features.index = data.index
+            writer.write(pd.concat([data, features], axis=1))
+            progress.update(len(data))
+
+        for data in manifest.new_rows(iter_dataset(input_path)):
+            in_flight.append((data, pool.submit(_score_in_worker, data[text_column].tolist())))
+            if len(in_flight) >= 2 * workers:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+    return manifest.merge()
+
+
+if __name__ == '__main__':
+    file_name = resolve_input("final")  # Replace with your file name
+    output_file = stage_path("text_features")
+    scored = run_pipeline(file_name, output_file, [VaderScorer(), EmpathScorer(), KeywordScorer()])
+    if EXPORT_EXCEL:
+        export_excel(output_file)
+    print(f"Feature extraction complete! Scored {scored} new or changed rows, results saved to {output_file}.")
@@ -1,5 +1,6 @@
-import pandas as pd
-from tqdm import tqdm
+from dataset_io import EXPORT_EXCEL, DatasetWriter, export_excel, iter_dataset, resolve_input, stage_path
+from incremental import StageManifest
+from keyword_matcher import compile_keywords, format_hits, matcher_pool
 
 # Define keywords related to depression
 depression_keywords = [
@@ -12,22 +13,39 @@ depression_keywords = [
     "medication", "mental health", "counselor", "therapy session", "coping", "self-care", "mindfulness"
 ]
 
+NUM_WORKERS = None  # process pool size for large files; defaults to the number of cores
+
 # Function to check if the comment or post contains any of the depression keywords
 def contains_depression_keywords(text, keywords):
-    # Convert text to lowercase for case-insensitive comparison
-    text_words = set(text.lower().split())  # Split text into unique words
-    return any(keyword.lower() in text_words for keyword in keywords)
+    # Single words and multi-word phrases are matched case-insensitively in one scan
+    return compile_keywords(tuple(keywords)).contains(text)
+
+if __name__ == '__main__':
+    # Load the posts/comments data chunk by chunk
+    input_file = resolve_input("user_comments_and_posts")
+    output_file = stage_path("filtered_depression_comments_and_posts")
+    matcher = compile_keywords(tuple(depression_keywords))
+    # Posts/comments checked by earlier runs are skipped; only new or edited ones are scanned
+    manifest = StageManifest(output_file, config={"keywords": depression_keywords})
+
+    # One process pool for the whole file, so chunks do not each pay for starting it
+    with matcher_pool(matcher, NUM_WORKERS) as pool, DatasetWriter(manifest.delta_path) as writer:
+        for df in manifest.new_rows(iter_dataset(input_file)):
+            # Step 1: Count keyword hits for every post/comment in one pass over the column
+            hits = matcher.scan(df['Text'], pool=pool)
+            df['Keyword Hits'] = hits['hits'].map(format_hits)
+            df['Keyword Count'] = hits['count']
 
-# Load the Excel file containing the posts/comments data
-df = pd.read_excel("user_comments_and_posts.xlsx")
+            # Step 2: Filter comments and posts based on keywords
+            df_filtered = df[hits['count'] > 0]
 
-# Step 1: Use tqdm to show a progress bar for the filtering process
-tqdm.pandas(desc="Filtering posts/comments with depression keywords")
+            # Step 3: Save the filtered data to the output file
+            writer.write(df_filtered)
 
-# Step 2: Filter comments and posts based on keywords
-df_filtered = df[df['Text'].progress_apply(lambda x: contains_depression_keywords(str(x), depression_keywords))]
+    # Step 4: Merge with the results of earlier runs; edited rows that no longer match are dropped
+    checked = manifest.merge()
 
-# Step 3: Save the filtered data to a new Excel file
-df_filtered.to_excel("filtered_depression_comments_and_posts.xlsx", index=False)
+    if EXPORT_EXCEL:
+        export_excel(output_file)
 
-print(f"Filtered data saved to filtered_depression_comments_and_posts.xlsx")
+    print(f"Checked {checked} new or changed posts/comments, filtered data saved to {output_file}")
@@ -1,57 +1,84 @@
-import praw
 import pandas as pd
+import pyarrow as pa
 from tqdm import tqdm
-from datetime import datetime
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from arcticshift.records import ITEM_SCHEMA, RecordBuffer, table_to_pandas
+from dataset_io import EXPORT_EXCEL, export_excel, stage_path, write_dataset
+from incremental import StageManifest
+from reddit_client import RedditClient, OAUTH_URL, AUTH_URL
 from secret import secret
 
-# Initialize Reddit API client
-reddit = praw.Reddit(**secret)
+# Number of users fetched at the same time; throughput is paced by the shared token bucket
+MAX_WORKERS = 16
 
-# Step 1: Read the list of users from the Excel file
-df_users = pd.read_excel("users.xlsx")  # Load the Excel file
-usernames = df_users.iloc[:, 0].tolist()  # Assuming usernames are in the first column
 
-# Initialize a list to store the fetched data
-comments_data = []
+def author_name(item):
+    return item["author"] if item.get("author") and item["author"] != "[deleted]" else "deleted"
 
-# Step 2: Fetch all comments and posts for each user
-for user in tqdm(usernames, desc="Fetching posts/comments"):
-    try:
-        user_data = reddit.redditor(user)
 
-         # Fetch the user's comments
-        for comment in user_data.comments.new(limit=None):
-            comments_data.append([comment.author.name if comment.author else "deleted",
-                                    comment.body,
-                                    comment.created_utc,
-                                    comment.subreddit.display_name,
-                                    'comment',
-                                    f"https://www.reddit.com{comment.permalink}"])  # Add the comment link
+def fetch_user(client, user):
+    """Fetch all comments and posts of one user as an Arrow table of the output columns."""
+    records = RecordBuffer(ITEM_SCHEMA)
+    # Fetch the user's comments
+    for comment in client.user_comments(user):
+        records.append(author_name(comment),
+                       comment["body"],
+                       int(comment["created_utc"]),
+                       comment["subreddit"],
+                       'comment',
+                       f"https://www.reddit.com{comment['permalink']}")  # Add the comment link
 
-        # Fetch the user's posts
-        for post in user_data.submissions.new(limit=None):
-            comments_data.append([post.author.name if post.author else "deleted",
-                                    post.title,
-                                    post.created_utc,
-                                    post.subreddit.display_name,
-                                    'post',
-                                    post.url])  # Add the post URL
+    # Fetch the user's posts
+    for post in client.user_submissions(user):
+        records.append(author_name(post),
+                       post["title"],
+                       int(post["created_utc"]),
+                       post["subreddit"],
+                       'post',
+                       post["url"])  # Add the post URL
+    return records.to_arrow()
 
-        # Optional: Sleep for a second to prevent hitting Reddit's rate limit
-        time.sleep(1)
 
-    except Exception as e:
-        print(f"Error fetching data for {user}: {e}")
+def fetch_users(usernames, client, max_workers=MAX_WORKERS):
+    """Fetch many users concurrently and return one table of their rows in the order of usernames."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_user, client, user): user for user in usernames}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Fetching posts/comments"):
+            user = futures[future]
+            try:
+                results[user] = future.result()
+            except Exception as e:
+                print(f"Error fetching data for {user}: {e}")
+    tables = [results[user] for user in usernames if user in results]
+    return pa.concat_tables(tables) if tables else RecordBuffer(ITEM_SCHEMA).to_arrow()
 
-# Step 3: Convert the collected data into a DataFrame
-df = pd.DataFrame(comments_data, columns=["Username", "Text", "Date", "Subreddit", "Type", "Link"])
 
-# Convert the 'Date' column to a readable format
-df['Date'] = pd.to_datetime(df['Date'], unit='s')
+def main(base_url=OAUTH_URL, auth_url=AUTH_URL):
+    # Step 1: Read the list of users from the Excel file
+    df_users = pd.read_excel("users.xlsx")  # Load the Excel file
+    usernames = df_users.iloc[:, 0].tolist()  # Assuming usernames are in the first column
 
-# Step 4: Save the data to Excel
-df.to_excel("user_comments_and_posts.xlsx", index=False)
+    # Step 2: Fetch all comments and posts for each user
+    client = RedditClient(secret, base_url=base_url, auth_url=auth_url, pool_size=MAX_WORKERS)
+    comments_data = fetch_users(usernames, client)
 
-print("Data saved to user_comments_and_posts.xlsx")
\ No newline at end of file
+    # Step 3: Convert the collected data into a DataFrame over the same buffers; 'Date' is already a timestamp
+    df = table_to_pandas(comments_data)
+
+    # Step 4: Merge new and edited posts/comments into the data of earlier runs for the next stage,
+    # and save to Excel only when a report is wanted
+    output_file = stage_path("user_comments_and_posts")
+    manifest = StageManifest(output_file)
+    for new_rows in manifest.new_rows([df]):
+        write_dataset(new_rows, manifest.delta_path)
+    print(f"{manifest.merge()} new or changed posts/comments")
+    if EXPORT_EXCEL:
+        export_excel(output_file)
+
+    print(f"Data saved to {output_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_io import DatasetWriter, iter_dataset, read_dataset
+
+# Process only rows a stage has not seen yet; False recomputes every stage from scratch
+INCREMENTAL = True
+
+ID_COLUMN = "row_id"
+# Reddit permalinks: /comments/<post id>/<slug>/<comment id>/
+PERMALINK = r"/comments/(?P<post>[a-z0-9]+)(?:/[^/]*/(?P<comment>[a-z0-9]+))?"
+# Columns hashed into an id for rows whose Link is not a Reddit permalink (e.g. link posts)
+FALLBACK_ID_COLUMNS = ["Username", "Date", "Type", "Link", "Text"]
+# Manifest metadata key of the stage configuration the rows were processed with
+CONFIG_KEY = b"stage_config"
+
+
+def row_ids(frame):
+    """Stable id per row: the frame's row_id column, else t1_/t3_ fullnames parsed from Link.
+
+    Rows without a permalink get "h_" plus a hash of their identifying columns.
+    """
+    if ID_COLUMN in frame:
+        return frame[ID_COLUMN].astype(str)
+    columns = [column for column in FALLBACK_ID_COLUMNS if column in frame] or list(frame.columns)
+    fallback = "h_" + pd.util.hash_pandas_object(frame[columns].astype(str), index=False).astype(str)
+    if "Link" not in frame:
+        return fallback
+    parts = frame["Link"].astype(str).str.extract(PERMALINK)
+    ids = np.where(parts["comment"].notna(), "t1_" + parts["comment"],
+                   np.where(parts["post"].notna(), "t3_" + parts["post"], fallback))
+    return pd.Series(ids, index=frame.index, dtype=object)
+
+
+def content_hashes(frame, column="Text"):
+    """64-bit hash of a row's content, so edited rows are picked up as changed."""
+    return pd.util.hash_pandas_object(frame[column].astype(str), index=False).to_numpy().view(np.int64)
+
+
+def config_fingerprint(config):
+    """Short hash of a JSON-able stage configuration; empty for stages without one."""
+    if config is None:
+        return ""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _stored_config(manifest_path):
+    metadata = pq.read_schema(manifest_path).metadata or {}
+    return metadata.get(CONFIG_KEY, b"").decode("utf-8")
+
+
+def delta_path(output_path):
+    stem, suffix = os.path.splitext(output_path)
+    return f"{stem}.delta{suffix}"
+
+
+class StageManifest:
+    """Row ids and content hashes a stage has already processed, stored next to its output.
+
+    new_rows() filters the input down to new or changed rows, the stage writes its
+    results for those rows to delta_path, and merge() folds them into the existing
+    output and records the rows as processed. With enabled=False the output and
+    manifest are removed first, so everything is recomputed.
+
+    config describes what the stage computes (categories, prompt template, scorers);
+    its fingerprint is saved with the manifest, and when it changes the output and
+    manifest are removed as well.
+    """
+
+    def __init__(self, output_path, content_column="Text", enabled=INCREMENTAL, config=None):
+        self.output_path = output_path
+        self.path = os.path.splitext(output_path)[0] + ".manifest.parquet"
+        self.delta_path = delta_path(output_path)
+        self.content_column = content_column
+        self.config = config_fingerprint(config)
+        self.pending = []
+        self.retry = set()
+        if enabled and os.path.exists(self.path) and _stored_config(self.path) != self.config:
+            print(f"Configuration of {output_path} changed, recomputing it")
+            enabled = False
+        # A delta left behind by an interrupted run is recomputed, not merged
+        for path in (self.delta_path,) if enabled else (self.delta_path, self.path, output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.path):
+            manifest = read_dataset(self.path)
+            self.index = pd.Index(manifest[ID_COLUMN])
+            self.hashes = manifest["content_hash"].to_numpy()
+        else:
+            self.index = pd.Index([], dtype=object)
+            self.hashes = np.empty(0, dtype=np.int64)
+
+    def new_rows(self, chunks):
+        """Yield only the new or changed rows of each chunk, with a row_id column added."""
+        for chunk in chunks:
+            chunk = chunk.assign(**{ID_COLUMN: row_ids(chunk).to_numpy()})
+            hashes = content_hashes(chunk, self.content_column)
+            positions = self.index.get_indexer(chunk[ID_COLUMN])
+            known = positions >= 0
+            changed = ~known
+            changed[known] = self.hashes[positions[known]] != hashes[known]
+            if changed.any():
+                self.pending.append(pd.DataFrame({ID_COLUMN: chunk[ID_COLUMN].to_numpy()[changed],
+                                                  "content_hash": hashes[changed]}))
+                yield chunk[changed]
+
+    def retry_later(self, ids):
+        """Leave rows out of the manifest so the next run processes them again (e.g. failed labels)."""
+        self.retry.update(ids)
+
+    def merge(self):
+        """Replace the processed rows of the output with the rows of the delta file and save the manifest.
+
+        Rows of an older output without a row_id column are kept unless they are
+        replaced, when their Link gives them the ids their input rows get; without a
+        Link they cannot be matched to the input and are dropped, since a stage
+        without a manifest processes every input row again anyway. Returns the
+        number of rows processed in this run.
+        """
+        if not self.pending:
+            # Nothing was new, so any delta the stage wrote is empty
+            if os.path.exists(self.delta_path):
+                os.remove(self.delta_path)
+            return 0
+        processed = pd.concat(self.pending, ignore_index=True)
+        replaced = pd.Index(processed[ID_COLUMN].unique())
+        delta_file = self.delta_path
+        has_delta = os.path.exists(delta_file)
+
+        if os.path.exists(self.output_path):
+            merged_file = delta_path(delta_file)
+            with DatasetWriter(merged_file) as writer:
+                for chunk in iter_dataset(self.output_path):
+                    if ID_COLUMN not in chunk:
+                        if "Link" not in chunk:
+                            # Output written before row ids existed, e.g. comment/score tables: recomputed in full
+                            continue
+                        # Output written before row ids existed: give its rows the ids their input rows get
+                        chunk = chunk.assign(**{ID_COLUMN: row_ids(chunk).to_numpy()})
+                    writer.write(chunk[~chunk[ID_COLUMN].isin(replaced)])
+                if has_delta:
+                    for chunk in iter_dataset(delta_file):
+                        writer.write(chunk)
+            os.replace(merged_file, self.output_path)
+            if has_delta:
+                os.remove(delta_file)
+        elif has_delta:
+            os.replace(delta_file, self.output_path)
+
+        # Fold the processed rows into the manifest, newest hash winning
+        manifest = pd.concat([pd.DataFrame({ID_COLUMN: self.index, "content_hash": self.hashes}), processed],
+                             ignore_index=True).drop_duplicates(ID_COLUMN, keep="last")
+        if self.retry:
+            manifest = manifest[~manifest[ID_COLUMN].isin(self.retry)]
+        table = pa.Table.from_pandas(manifest, preserve_index=False)
+        pq.write_table(table.replace_schema_metadata({**table.schema.metadata,
+                                                      CONFIG_KEY: self.config.encode("utf-8")}), self.path)
+        self.index = pd.Index(manifest[ID_COLUMN])
+        self.hashes = manifest["content_hash"].to_numpy()
+        self.pending = []
+        self.retry = set()
+        return len(processed)
@@ -0,0 +1,86 @@
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+
+CHUNK_SIZE = 20_000  # texts per worker task when scanning with a process pool
+
+_worker_matcher = None
+
+
+class KeywordMatcher:
+    """Match a list of keywords and multi-word phrases with one compiled regex.
+
+    Keywords match case-insensitively on whole words, phrases match across any run of
+    whitespace, and a word joined by a hyphen (e.g. "self-harm") is one word. Longer
+    keywords win where they overlap, so "panic attack" is reported instead of "panic".
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords))
+        alternation = "|".join(re.escape(keyword).replace(r"\ ", r"\s+")
+                               for keyword in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<![\w-])(?:{alternation})(?![\w-])", re.IGNORECASE)
+
+    def contains(self, text):
+        return self.pattern.search(text) is not None
+
+    def counts(self, text):
+        """Counter of keyword -> number of hits in the text."""
+        return Counter(" ".join(match.lower().split()) for match in self.pattern.findall(text))
+
+    def count_texts(self, texts):
+        return [self.counts(text) for text in texts]
+
+    def scan(self, texts, workers=None, chunk_size=CHUNK_SIZE, pool=None):
+        """Count hits for a whole column of texts in one linear pass over each text.
+
+        Returns a DataFrame aligned with texts, with the per-text Counter in "hits" and
+        the total number of hits in "count". Columns larger than chunk_size are split
+        across a process pool unless workers is 1: the given pool, made by
+        matcher_pool() for this matcher when scanning many columns, or else a pool
+        started for this call.
+        """
+        texts = pd.Series(texts)
+        values = [str(text) for text in texts]
+        if workers == 1 or len(values) <= chunk_size:
+            hits = self.count_texts(values)
+        elif pool is not None:
+            hits = _count_in_pool(pool, values, chunk_size)
+        else:
+            with matcher_pool(self, workers) as pool:
+                hits = _count_in_pool(pool, values, chunk_size)
+        return pd.DataFrame({"hits": hits, "count": [sum(counter.values()) for counter in hits]},
+                            index=texts.index)
+
+
+def _init_worker(matcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _count_chunk(texts):
+    return _worker_matcher.count_texts(texts)
+
+
+def _count_in_pool(pool, values, chunk_size):
+    chunks = [values[start:start + chunk_size] for start in range(0, len(values), chunk_size)]
+    return [counter for chunk_hits in pool.map(_count_chunk, chunks) for counter in chunk_hits]
+
+
+def matcher_pool(matcher, workers=None):
+    """Process pool whose workers receive the matcher once, for scan(pool=...) over many chunks."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matcher,))
+
+
+@lru_cache(maxsize=32)
+def compile_keywords(keywords):
+    """Cached KeywordMatcher for a tuple of keywords."""
+    return KeywordMatcher(keywords)
+
+
+def format_hits(counter):
+    """Render a hit Counter as "keyword:count; ..." for spreadsheets."""
+    return "; ".join(f"{keyword}:{count}" for keyword, count in counter.most_common())
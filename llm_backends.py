@@ -0,0 +1,180 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import lsqr
+from tqdm import tqdm
+
+from dataset_io import read_dataset
+from llm_labeling import LabelingEngine
+from llm_parsing import ParseStats
+from reliability import intraclass_corr
+
+N_FEATURES = 2 ** 20          # hashed unigram and bigram buckets
+ALPHA = 1.0                   # ridge penalty
+HOLDOUT = 0.2                 # share of the labeled comments kept back for the agreement report
+INFERENCE_CHUNK = 20_000      # comments per worker task
+ICC_GOOD_ENOUGH = 0.75        # ICC2 against the GPT labels from which the local model can stand in
+# Words (with apostrophes) and single punctuation or emoji characters
+TOKEN = r"[a-z0-9']+|[^\sa-z0-9]"
+BIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Labeled output of each LLM script -> (local model file, score columns)
+LOCAL_MODELS = {
+    "labeled_comments2.csv": ("local_sentiment_model.npz", ["depression score", "well_being score"]),
+    "labeled_humor.csv": ("local_humor_model.npz", ["Humor Intent", "Commenter's Amusement"]),
+}
+
+_worker_model = None
+
+
+def hashed_features(texts, n_features=N_FEATURES):
+    """Sparse bag of hashed unigrams and bigrams, log-scaled and L2-normalized per comment.
+
+    Tokens are hashed with pandas' fixed-key hash, so features are the same in every
+    process and run, and bigrams combine the hashes of neighbouring tokens.
+    """
+    tokens = pd.Series(texts, dtype=object).fillna("").astype(str).str.lower().str.findall(TOKEN).explode().dropna()
+    rows = tokens.index.to_numpy(np.int64)
+    hashes = pd.util.hash_array(tokens.to_numpy(object))
+    same_comment = rows[1:] == rows[:-1]
+    bigrams = (hashes[:-1] * BIGRAM_MULTIPLIER) ^ hashes[1:]
+    rows = np.concatenate([rows, rows[1:][same_comment]])
+    columns = (np.concatenate([hashes, bigrams[same_comment]]) % np.uint64(n_features)).astype(np.int64)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                               shape=(len(texts), n_features))
+    matrix.sum_duplicates()
+    matrix.data = np.log1p(matrix.data)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+class LocalLabeler:
+    """Ridge regression on hashed n-grams, distilled from the GPT labels of earlier runs.
+
+    One linear head per score; predictions are rounded and clipped to the range of
+    the training labels, so they look like the scores the LLM scripts store.
+    """
+
+    def __init__(self, weights, intercepts, low, high, n_features=N_FEATURES):
+        self.weights = weights
+        self.intercepts = intercepts
+        self.low = low
+        self.high = high
+        self.n_features = n_features
+
+    @staticmethod
+    def fit(texts, scores, alpha=ALPHA, n_features=N_FEATURES):
+        features = hashed_features(texts, n_features)
+        scores = np.asarray(scores, dtype=float)
+        intercepts = scores.mean(axis=0)
+        # lsqr with damp minimizes |Xw - y|^2 + damp^2 |w|^2, i.e. ridge on the centred scores
+        weights = np.column_stack([lsqr(features, scores[:, j] - intercepts[j], damp=np.sqrt(alpha))[0]
+                                   for j in range(scores.shape[1])]).astype(np.float32)
+        return LocalLabeler(weights, intercepts, scores.min(axis=0), scores.max(axis=0), n_features)
+
+    def predict(self, texts):
+        scores = hashed_features(texts, self.n_features) @ self.weights + self.intercepts
+        return np.clip(np.rint(scores), self.low, self.high).astype(np.int64)
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, intercepts=self.intercepts, low=self.low, high=self.high,
+                            n_features=self.n_features)
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as arrays:
+            return LocalLabeler(arrays["weights"], arrays["intercepts"], arrays["low"], arrays["high"],
+                                int(arrays["n_features"]))
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _predict_chunk(texts):
+    return _worker_model.predict(texts)
+
+
+class LocalBackend:
+    """CPU-only drop-in for LabelingEngine: same label_all(), scores from a LocalLabeler.
+
+    Comments are labeled in chunks spread over a process pool, so the model is
+    loaded once per worker; results are tuples of scores, like the API's.
+    """
+
+    def __init__(self, model_path, workers=None, chunk_size=INFERENCE_CHUNK):
+        self.model = LocalLabeler.load(model_path)
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.parse_stats = ParseStats()
+
+    def label_all(self, comments, desc="Processing comments"):
+        comments = list(comments)
+        chunks = [comments[i:i + self.chunk_size] for i in range(0, len(comments), self.chunk_size)]
+        if len(chunks) <= 1 or self.workers == 1:
+            scores = [self.model.predict(chunk) for chunk in tqdm(chunks, desc=desc)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.model,)) as pool:
+                scores = list(tqdm(pool.map(_predict_chunk, chunks), total=len(chunks), desc=desc))
+        return [tuple(row) for chunk in scores for row in chunk.tolist()]
+
+
+def make_backend(kind, task, model_path=None, **engine_options):
+    """The labeling backend of a script: "openai" (LabelingEngine) or "local" (LocalBackend).
+
+    engine_options go to the backend's constructor, e.g. cache= and metrics= for
+    LabelingEngine or workers= for LocalBackend.
+    """
+    if kind == "openai":
+        return LabelingEngine(task, **engine_options)
+    if kind == "local":
+        return LocalBackend(model_path, **engine_options)
+    raise ValueError(f"Unknown labeling backend: {kind}")
+
+
+def agreement_report(gpt_scores, local_scores, names, n_boot=200):
+    """ICC2 (with bootstrap CI), mean absolute error and exact agreement of each score.
+
+    A score is good_enough when its ICC2 against the GPT labels reaches ICC_GOOD_ENOUGH.
+    """
+    rows = []
+    for j, name in enumerate(names):
+        pairs = pd.DataFrame({"comment": np.arange(len(gpt_scores)), "gpt": gpt_scores[:, j],
+                              "local": local_scores[:, j]})
+        icc = intraclass_corr(pairs, target="comment", raters=["gpt", "local"], n_boot=n_boot).set_index("Type")
+        rows.append({"score": name, "ICC2": icc.loc["ICC2", "ICC"], "CI95%": icc.loc["ICC2"].get("CI95%"),
+                     "MAE": np.abs(gpt_scores[:, j] - local_scores[:, j]).mean(),
+                     "exact": (gpt_scores[:, j] == local_scores[:, j]).mean(),
+                     "good_enough": icc.loc["ICC2", "ICC"] >= ICC_GOOD_ENOUGH})
+    return pd.DataFrame(rows)
+
+
+def train_local_model(labeled_path, score_columns, model_path, text_column="comment", seed=0):
+    """Fit a LocalLabeler on an LLM script's output and save it to model_path.
+
+    HOLDOUT of the comments are kept back; returns the model and the agreement
+    report of its predictions on them against the GPT labels.
+    """
+    labeled = read_dataset(labeled_path).dropna(subset=score_columns)
+    holdout = np.random.default_rng(seed).random(len(labeled)) < HOLDOUT
+    train, test = labeled[~holdout], labeled[holdout]
+    model = LocalLabeler.fit(train[text_column].tolist(), train[score_columns].to_numpy())
+    model.save(model_path)
+    report = agreement_report(test[score_columns].to_numpy(), model.predict(test[text_column].tolist()),
+                              score_columns)
+    return model, report
+
+
+if __name__ == '__main__':
+    for labeled_path, (model_path, score_columns) in LOCAL_MODELS.items():
+        if not os.path.exists(labeled_path):
+            continue
+        _, report = train_local_model(labeled_path, score_columns, model_path)
+        print(f"{model_path}, held-out agreement with the GPT labels:")
+        print(report)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+LLM_CACHE_PATH = "llm_cache.sqlite"
+LLM_CACHE_MAX_ENTRIES = 2_000_000
+TRIM_EVERY = 1000  # puts between checks of the cache size
+
+
+def text_hash(text):
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+class LabelCache:
+    """Content-addressed cache of LLM labels, keyed on (model, prompt template hash, comment hash).
+
+    Both the parsed scores and the raw reply are kept. Once the cache grows past
+    max_entries the least recently used entries are evicted. Hits and misses are
+    counted for the run.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS labels (model TEXT, template TEXT, comment TEXT, scores TEXT, raw TEXT,
+                                               last_used REAL, PRIMARY KEY (model, template, comment))
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS labels_last_used ON labels (last_used)")
+        self.conn.commit()
+
+    def get_many(self, model, template, comments):
+        """Return {comment: scores tuple} for the cached comments and count hits and misses."""
+        keys = {text_hash(comment): comment for comment in comments}
+        found = {}
+        hashes = list(keys)
+        # SQLite limits the number of bound parameters, so look keys up in slices
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            rows = self.conn.execute(f"""
+                SELECT comment, scores FROM labels
+                WHERE model = ? AND template = ? AND comment IN ({",".join("?" * len(chunk))})
+            """, (model, template, *chunk)).fetchall()
+            for key, scores in rows:
+                found[keys[key]] = tuple(json.loads(scores))
+        with self.conn:
+            self.conn.executemany("UPDATE labels SET last_used = ? WHERE model = ? AND template = ? AND comment = ?",
+                                  [(time.time(), model, template, text_hash(comment)) for comment in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, template, entries):
+        """Store (comment, scores, raw reply) entries."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(model, template, text_hash(comment), json.dumps(list(scores)), raw, now)
+                                   for comment, scores, raw in entries])
+            self.puts += len(entries)
+            if self.puts >= TRIM_EVERY:
+                self.puts = 0
+                self._trim()
+
+    def _trim(self):
+        """Evict the least recently used entries beyond max_entries."""
+        size = self.conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+        if size > self.max_entries:
+            self.conn.execute("""
+                DELETE FROM labels WHERE rowid IN (SELECT rowid FROM labels ORDER BY last_used LIMIT ?)
+            """, (size - self.max_entries,))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+import openai
+from tqdm import tqdm
+
+from llm_cache import text_hash
+from llm_parsing import ParseError, ParseStats, parse_batch_scores, parse_scores, score_range
+from llm_prompts import MAX_COMMENT_TOKENS, REPLY_MARGIN, compact, count_tokens, truncate
+
+MODEL = "gpt-4-turbo"
+CONCURRENCY = 8               # requests in flight at once
+BATCH_SIZE = 1                # comments packed into one prompt
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 30_000
+MAX_RETRIES = 5
+PARSE_RETRIES = 2             # later passes that re-ask only the comments whose reply could not be read
+
+# Errors worth another attempt; anything else fails the item straight away
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.APIError, openai.error.Timeout,
+                    openai.error.ServiceUnavailableError, openai.error.APIConnectionError)
+
+
+class LabelTask:
+    """The prompt and answer format of one labeling job.
+
+    The rubric goes, compacted, into the system message, so every request of a run
+    starts with the same prefix and packed multi-comment prompts state it once for
+    the whole batch; fields are the score names the model has to answer with.
+    Comments longer than max_comment_tokens are truncated, and unless max_tokens is
+    given the reply budget per comment is sized from the answer format.
+    With json_mode the first pass already asks for the structured JSON reply that
+    retry passes use, and requests the API's JSON response format.
+    """
+
+    def __init__(self, system_prompt, rubric, fields, scale, model=MODEL, max_tokens=None, json_mode=False,
+                 max_comment_tokens=MAX_COMMENT_TOKENS):
+        self.system_prompt = system_prompt
+        self.rubric = compact(rubric)
+        self.fields = fields
+        self.scale = scale
+        self.low, self.high = score_range(scale)
+        self.model = model
+        self.json_mode = json_mode
+        self.max_comment_tokens = max_comment_tokens
+        self.max_tokens = max_tokens or self.reply_tokens()
+
+    def reply_tokens(self):
+        """Tokens of one comment's answer in the longer of the two reply formats, plus a margin."""
+        block = "Comment 100:\n" + "".join(f"{field}: {self.high}\n" for field in self.fields)
+        structured = json.dumps({field: self.high for field in self.fields}) + ", "
+        return max(count_tokens(block, self.model), count_tokens(structured, self.model)) + REPLY_MARGIN
+
+    def messages(self, prompt):
+        return [{"role": "system", "content": f"{self.system_prompt}\n\n{self.rubric}"},
+                {"role": "user", "content": prompt}]
+
+    def fit(self, comment):
+        comment = str(comment)
+        if self.max_comment_tokens is None:
+            return comment
+        return truncate(comment, self.max_comment_tokens, self.model)
+
+    def prompt(self, comment):
+        response_format = "".join(f"{field}: {self.scale}\n" for field in self.fields)
+        return f"""Comment: "{self.fit(comment)}"
+
+Response format:
+{response_format}"""
+
+    def batch_prompt(self, comments):
+        numbered = "\n".join(f'Comment {i}: "{self.fit(comment)}"' for i, comment in enumerate(comments, 1))
+        response_format = "".join(f"{field}: {self.scale}\n" for field in self.fields)
+        return f"""Rate each of the following {len(comments)} comments on its own.
+
+{numbered}
+
+Response format, one block per comment in the same order:
+Comment <number>:
+{response_format}"""
+
+    def structured_prompt(self, comments):
+        """Prompt asking for a JSON reply, used for retries and in json_mode."""
+        scores = ", ".join(f'"{field}": <integer {self.low} to {self.high}>' for field in self.fields)
+        if len(comments) == 1:
+            return f"""Comment: "{self.fit(comments[0])}"
+
+Reply with only this JSON object and nothing else:
+{{{scores}}}"""
+        numbered = "\n".join(f'Comment {i}: "{self.fit(comment)}"' for i, comment in enumerate(comments, 1))
+        return f"""Rate each of the following {len(comments)} comments on its own.
+
+{numbered}
+
+Reply with only this JSON object and nothing else, with one entry per comment in the same order:
+{{"results": [{{{scores}}}, ...]}}"""
+
+    def template_hash(self):
+        """Identifies the prompt template, so cached labels are only reused for the same prompt."""
+        return text_hash(json.dumps([self.system_prompt, self.rubric, self.fields, self.scale,
+                                     self.max_comment_tokens]))
+
+    def max_tokens_for(self, n_comments):
+        return self.max_tokens * n_comments
+
+    def parse(self, result):
+        """Read the field scores out of a single-comment reply; raises ParseError."""
+        return parse_scores(result, self.fields, self.low, self.high)
+
+    def parse_batch(self, result, n_comments):
+        """Scores of every comment of a packed reply; unreadable ones come back as ParseError."""
+        return parse_batch_scores(result, self.fields, self.low, self.high, n_comments)
+
+
+class RateLimiter:
+    """Async token buckets for requests and tokens per minute with adaptive pacing.
+
+    Each rate-limit error halves the allowed rate, and each success wins a little of
+    it back, so the engine settles just below whatever the API actually allows.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 min_scale=0.05):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.requests = 1.0
+        self.tokens = float(tokens_per_minute) / 60
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self, tokens):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        request_rate = self.requests_per_minute * self.scale / 60
+        token_rate = self.tokens_per_minute * self.scale / 60
+        self.requests = min(max(1.0, request_rate), self.requests + elapsed * request_rate)
+        # Allow a single request bigger than a second's worth of tokens to go through eventually
+        self.tokens = min(max(token_rate, tokens), self.tokens + elapsed * token_rate)
+        return request_rate, token_rate
+
+    async def acquire(self, tokens):
+        async with self.lock:
+            while True:
+                request_rate, token_rate = self._refill(tokens)
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max((1 - self.requests) / request_rate, (tokens - self.tokens) / token_rate)
+                await asyncio.sleep(wait)
+
+    def backoff(self):
+        self.scale = max(self.min_scale, self.scale / 2)
+
+    def recover(self):
+        self.scale = min(1.0, self.scale + 0.02)
+
+
+class LabelingEngine:
+    """Label many comments with concurrent, rate-limited chat completion calls.
+
+    Comments are packed batch_size to a prompt, up to concurrency prompts are in flight
+    at once, and failed calls are retried with jittered exponential backoff.
+    Comments whose reply could not be read are collected and re-asked, with a
+    JSON reply format and smaller batches, in up to parse_retries later passes.
+    With a LabelCache, comments already labeled with the same model and prompt are
+    answered from the cache and only the rest are sent. With a MetricsLog, every API
+    call's latency, token counts and estimated cost are recorded. api_base can point
+    at a local mock completion server.
+    """
+
+    def __init__(self, task, concurrency=CONCURRENCY, batch_size=BATCH_SIZE,
+                 requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES, parse_retries=PARSE_RETRIES, api_base=None, cache=None, metrics=None):
+        self.task = task
+        self.cache = cache
+        self.metrics = metrics
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.parse_retries = parse_retries
+        self.api_base = api_base
+        self.parse_stats = ParseStats()
+
+    def prompt_tokens(self, messages):
+        # Chat messages carry a few tokens of framing each on top of their content
+        return sum(count_tokens(message["content"], self.task.model) + 4 for message in messages)
+
+    async def _complete(self, prompt, n_comments, structured=False, retry=False):
+        """One chat completion with retries; returns the reply text."""
+        kwargs = {"api_base": self.api_base} if self.api_base else {}
+        if structured and self.task.json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        messages = self.task.messages(prompt)
+        prompt_tokens = self.prompt_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(prompt_tokens + self.task.max_tokens_for(n_comments))
+            started = time.monotonic()
+            try:
+                response = await openai.ChatCompletion.acreate(
+                    model=self.task.model,
+                    messages=messages,
+                    max_tokens=self.task.max_tokens_for(n_comments),
+                    temperature=0.0,
+                    **kwargs
+                )
+                self.limiter.recover()
+                reply = response['choices'][0]['message']['content'].strip()
+                if self.metrics is not None:
+                    usage = response.get('usage') or {}
+                    self.metrics.record(self.task.model, self.template, n_comments, started,
+                                        usage.get('prompt_tokens', prompt_tokens),
+                                        usage.get('completion_tokens', count_tokens(reply, self.task.model)),
+                                        ok=True, retry=retry)
+                return reply
+            except RETRYABLE_ERRORS as e:
+                if self.metrics is not None:
+                    self.metrics.record(self.task.model, self.template, n_comments, started, prompt_tokens, 0,
+                                        ok=False, retry=retry)
+                if attempt == self.max_retries:
+                    raise
+                if isinstance(e, openai.error.RateLimitError):
+                    self.limiter.backoff()
+                await asyncio.sleep(min(60, 2 ** attempt) * random.uniform(0.5, 1.5))
+
+    async def _label_group(self, comments, retry=False):
+        """Label one prompt's worth of comments; returns (result, raw reply) per comment.
+
+        A result is a scores tuple, a ParseError for a reply that could not be read,
+        or an error message when the request itself failed.
+        """
+        structured = retry or self.task.json_mode
+        if structured:
+            prompt = self.task.structured_prompt(comments)
+        else:
+            prompt = self.task.prompt(comments[0]) if len(comments) == 1 else self.task.batch_prompt(comments)
+        async with self.semaphore:
+            try:
+                result = await self._complete(prompt, len(comments), structured, retry)
+            except Exception as e:
+                return [(f"Error processing comment: {e}", None)] * len(comments)
+        if len(comments) == 1:
+            try:
+                return [(self.task.parse(result), result)]
+            except ParseError as e:
+                return [(e, result)]
+        return [(label, result) for label in self.task.parse_batch(result, len(comments))]
+
+    async def label_all_async(self, comments, desc="Processing comments"):
+        self.limiter = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        model, template = self.task.model, self.task.template_hash()
+        self.template = template[:12]
+
+        # Identical comments are labeled once, and cached ones not at all
+        unique = list(dict.fromkeys(comments))
+        labels = self.cache.get_many(model, template, unique) if self.cache is not None else {}
+        pending = [comment for comment in unique if comment not in labels]
+
+        async def run(group, retry, progress):
+            group_results = await self._label_group(group, retry)
+            self.parse_stats.record(len(group), [label for label, _ in group_results], retry)
+            for comment, (label, _) in zip(group, group_results):
+                labels[comment] = label
+            if self.cache is not None:
+                self.cache.put_many(model, template, [(comment, label, raw)
+                                                      for comment, (label, raw) in zip(group, group_results)
+                                                      if isinstance(label, tuple)])
+            progress.update(len(group))
+
+        # One pooled HTTP session for every request of the run
+        async with aiohttp.ClientSession() as session:
+            openai.aiosession.set(session)
+            batch_size = self.batch_size
+            for attempt in range(self.parse_retries + 1):
+                if not pending:
+                    break
+                # Retry passes ask for JSON and pack fewer comments, since long packed replies break most often
+                groups = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+                title = desc if not attempt else f"Re-asking unreadable replies ({attempt})"
+                with tqdm(total=len(pending), desc=title) as progress:
+                    await asyncio.gather(*(run(group, attempt > 0, progress) for group in groups))
+                pending = [comment for comment in pending if isinstance(labels[comment], ParseError)]
+                batch_size = max(1, batch_size // 2)
+        return [str(labels[comment]) if isinstance(labels[comment], ParseError) else labels[comment]
+                for comment in comments]
+
+    def label_all(self, comments, desc="Processing comments"):
+        """Label every comment; each result is a tuple of scores or an error message.
+
+        Parse failure rates of the run are kept in parse_stats.
+        """
+        return asyncio.run(self.label_all_async(list(comments), desc=desc))
@@ -0,0 +1,205 @@
+import json
+import re
+from collections import Counter
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+# A scale such as "0 to 5" or "[0–5]" where a score should be, e.g. an echoed response template
+RANGE = re.compile(r"\d+(?:\.\d+)?\s*(?:to|[-–—])\s*\d")
+# "Comment 2:", "**Comment 2**", "### Comment #2." and the like at the start of a line
+COMMENT_HEADER = re.compile(r"(?im)^[\s#>*_-]*comment\s*#?\s*(\d+)[\s*_]*[:.)-]?")
+
+
+class ParseError(ValueError):
+    """A reply the scores could not be read from; reason says why, for the failure stats."""
+
+    def __init__(self, reason, reply):
+        super().__init__(f"Unexpected response format ({reason}): {reply}")
+        self.reason = reason
+
+
+def score_range(scale):
+    """(low, high) of a scale description such as "[0 to 5]" or "[0–5]"."""
+    numbers = re.findall(r"\d+", scale)
+    return int(numbers[0]), int(numbers[-1])
+
+
+def normalize(name):
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+def _field_pattern(field):
+    # Any punctuation, markdown or quote style between the words of the name, then the first number;
+    # the second group catches a range starting at that number
+    words = r"[^a-z0-9\n]*".join(re.escape(word) for word in normalize(field).split())
+    return re.compile(rf"(?i){words}[^\w\n]*?(-?\d+(?:\.\d+)?)(\s*(?:to|[-–—])\s*\d)?")
+
+
+def _json_values(text):
+    """Every JSON object or array in the reply, code fences and surrounding prose ignored."""
+    decoder = json.JSONDecoder()
+    values, position = [], 0
+    while True:
+        starts = [i for i in (text.find("{", position), text.find("[", position)) if i >= 0]
+        if not starts:
+            return values
+        try:
+            value, end = decoder.raw_decode(text, min(starts))
+        except ValueError:
+            position = min(starts) + 1
+            continue
+        values.append(value)
+        position = end
+
+
+def _check(scores, low, high, reply):
+    scores = [float(score) for score in scores]
+    if any(score != int(score) or not low <= score <= high for score in scores):
+        raise ParseError("score out of range", reply)
+    return tuple(int(score) for score in scores)
+
+
+def _from_mapping(mapping, fields, low, high, reply):
+    keys = {normalize(str(key)): value for key, value in mapping.items()}
+    scores = []
+    for field in fields:
+        name = normalize(field)
+        value = keys.get(name)
+        if value is None:
+            # Shortened or extended names such as "Depression" or "Depression/Sadness score"
+            value = next((value for key, value in keys.items() if key and (key in name or name in key)), None)
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if isinstance(value, str) and RANGE.search(value):
+            raise ParseError("range instead of a score", reply)
+        if isinstance(value, str) and NUMBER.search(value):
+            value = NUMBER.search(value).group()
+        if not isinstance(value, (int, float, str)) or isinstance(value, bool):
+            raise ParseError(f"missing {field}", reply)
+        scores.append(value)
+    return _check(scores, low, high, reply)
+
+
+def parse_scores(reply, fields, low, high):
+    """Read one comment's field scores out of a reply, as a tuple of ints.
+
+    JSON objects are read first; otherwise every field is looked up by name in the
+    text, tolerating markdown, brackets and "3/5" style answers; a reply of just the
+    right number of in-range numbers (e.g. "[3]") is taken in field order.
+    A range where a score should be ("0 to 5", an echoed template) is not read as
+    its first number. Raises ParseError when none of these works.
+    """
+    for value in _json_values(reply):
+        if isinstance(value, dict):
+            try:
+                return _from_mapping(value, fields, low, high, reply)
+            except ParseError:
+                continue
+        if isinstance(value, list) and len(value) == len(fields) and all(
+                isinstance(score, (int, float)) for score in value):
+            return _check(value, low, high, reply)
+
+    matches = [_field_pattern(field).search(reply) for field in fields]
+    if any(match and match.group(2) for match in matches):
+        raise ParseError("range instead of a score", reply)
+    if all(matches):
+        return _check([match.group(1) for match in matches], low, high, reply)
+
+    if RANGE.search(reply):
+        raise ParseError("range instead of a score", reply)
+    numbers = NUMBER.findall(reply)
+    if len(numbers) == len(fields) and not any(matches):
+        return _check(numbers, low, high, reply)
+    if numbers and not any(matches):
+        raise ParseError("no field names", reply)
+    raise ParseError(f"missing {fields[matches.index(None)]}", reply)
+
+
+def _json_items(reply, n_comments):
+    """Per-comment JSON objects of a structured batch reply, or None if there are none."""
+    for value in _json_values(reply):
+        if isinstance(value, dict):
+            lists = [item for item in value.values() if isinstance(item, list)]
+            if len(value) == 1 and lists:
+                value = lists[0]
+            elif value and all(isinstance(item, dict) for item in value.values()):
+                # {"1": {...}, "Comment 2": {...}} keyed by comment number
+                numbered = {int(NUMBER.search(str(key)).group()): item for key, item in value.items()
+                            if NUMBER.search(str(key))}
+                return [numbered.get(i) for i in range(1, n_comments + 1)]
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            return value[:n_comments] + [None] * (n_comments - len(value))
+    return None
+
+
+def parse_batch_scores(reply, fields, low, high, n_comments):
+    """Scores for each comment of a packed reply, in order.
+
+    A JSON list (or {"results": [...]}) of per-comment objects is used when present,
+    otherwise the reply is split into its "Comment <n>:" blocks. Comments that are
+    missing or unreadable come back as ParseError instances instead of tuples.
+    """
+    items = _json_items(reply, n_comments)
+    if items is not None:
+        results = []
+        for item in items:
+            try:
+                results.append(ParseError("missing comment", reply) if item is None
+                               else _from_mapping(item, fields, low, high, reply))
+            except ParseError as e:
+                results.append(e)
+        return results
+
+    blocks = {}
+    parts = COMMENT_HEADER.split(reply)
+    for number, block in zip(parts[1::2], parts[2::2]):
+        blocks.setdefault(int(number), block)
+    results = []
+    for i in range(1, n_comments + 1):
+        if i not in blocks:
+            results.append(ParseError("missing comment", reply))
+            continue
+        try:
+            results.append(parse_scores(blocks[i], fields, low, high))
+        except ParseError as e:
+            results.append(ParseError(e.reason, reply))
+    return results
+
+
+class ParseStats:
+    """Parse failure counts of a labeling run, per prompt size and per reason.
+
+    Only replies that came back and could not be read count as failures; requests
+    that failed outright are not parse failures. Items re-asked in a retry pass
+    are counted once per pass.
+    """
+
+    def __init__(self):
+        self.items = Counter()
+        self.failures = Counter()
+        self.reasons = Counter()
+        self.retried = 0
+        self.recovered = 0
+
+    def record(self, batch_size, results, retry=False):
+        for result in results:
+            if isinstance(result, str):
+                continue
+            self.items[batch_size] += 1
+            if isinstance(result, ParseError):
+                self.failures[batch_size] += 1
+                self.reasons[result.reason] += 1
+            elif retry:
+                self.recovered += 1
+        if retry:
+            self.retried += len(results)
+
+    def report(self):
+        items, failures = sum(self.items.values()), sum(self.failures.values())
+        return {"items": items,
+                "parse_failures": failures,
+                "failure_rate": failures / items if items else 0.0,
+                "failure_rate_by_batch_size": {size: self.failures[size] / self.items[size]
+                                               for size in sorted(self.items)},
+                "retried": self.retried,
+                "recovered": self.recovered,
+                "reasons": dict(self.reasons.most_common())}
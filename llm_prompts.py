@@ -0,0 +1,144 @@
+import json
+import re
+import textwrap
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character based estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4           # rough token size when tiktoken is not installed
+MAX_COMMENT_TOKENS = 512      # longer comments keep their start and end, the middle is cut
+TRUNCATION_MARK = " [...] "
+REPLY_MARGIN = 8              # extra reply tokens per comment for stray whitespace or punctuation
+LLM_METRICS_PATH = "llm_metrics.jsonl"
+
+# USD per 1000 (prompt, completion) tokens, used for the cost estimate of the metrics log
+PRICES_PER_1K = {
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate(text, max_tokens, model):
+    """Cut text down to about max_tokens, keeping its first three quarters and last quarter of the budget."""
+    encoding = _encoding(model)
+    if encoding is None:
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        head, tail = max_tokens * CHARS_PER_TOKEN * 3 // 4, max_tokens * CHARS_PER_TOKEN // 4
+        return text[:head] + TRUNCATION_MARK + text[-tail:]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    head, tail = max_tokens * 3 // 4, max_tokens // 4
+    return encoding.decode(tokens[:head]) + TRUNCATION_MARK + encoding.decode(tokens[-tail:])
+
+
+def compact(text):
+    """Prompt text without the common indentation, trailing spaces and repeated blank lines."""
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of one request, None for models without a known price."""
+    prices = PRICES_PER_1K.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+
+class MetricsLog:
+    """Per-request latency, token counts and estimated cost, appended to a JSON lines file.
+
+    Every API call is one line, tagged with the model, prompt template and batch size,
+    so runs of different prompt variants can be compared later with compare_variants().
+    Token counts come from the API's usage field when present and from the local
+    estimate otherwise.
+    """
+
+    def __init__(self, path=LLM_METRICS_PATH):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.records = []
+        self.spans = []
+
+    def record(self, model, template, n_comments, started, prompt_tokens, completion_tokens, ok, retry=False):
+        entry = {"time": time.time(), "model": model, "template": template, "batch_size": n_comments,
+                 "retry": retry, "ok": ok, "latency_s": time.monotonic() - started,
+                 "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "cost_usd": cost(model, prompt_tokens, completion_tokens) if ok else 0.0}
+        self.records.append(entry)
+        if ok:
+            self.spans.append((started, started + entry["latency_s"]))
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def summary(self):
+        """Totals of this run: requests, tokens, cost, latency percentiles and comments per second."""
+        ok = [entry for entry in self.records if entry["ok"]]
+        if not ok:
+            return {"requests": len(self.records), "failed": len(self.records)}
+        latencies = np.array([entry["latency_s"] for entry in ok])
+        wall = max(end for _, end in self.spans) - min(start for start, _ in self.spans)
+        comments = sum(entry["batch_size"] for entry in ok)
+        costs = [entry["cost_usd"] for entry in ok]
+        return {"requests": len(self.records),
+                "failed": len(self.records) - len(ok),
+                "comments": comments,
+                "prompt_tokens": sum(entry["prompt_tokens"] for entry in ok),
+                "completion_tokens": sum(entry["completion_tokens"] for entry in ok),
+                "cost_usd": None if None in costs else sum(costs),
+                "latency_p50_s": float(np.percentile(latencies, 50)),
+                "latency_p95_s": float(np.percentile(latencies, 95)),
+                "comments_per_s": comments / wall if wall > 0 else None}
+
+    def close(self):
+        self.file.close()
+
+
+def compare_variants(path=LLM_METRICS_PATH):
+    """Benchmark table of every (model, template, batch size) variant in a metrics file.
+
+    Reports requests, the share that failed, mean and p95 latency, and prompt tokens,
+    completion tokens and cost per labeled comment.
+    """
+    keys = ["model", "template", "batch_size"]
+    metrics = pd.read_json(path, lines=True)
+    groups = metrics[metrics["ok"]].groupby(keys)
+    comments = groups["batch_size"].sum()
+    table = pd.DataFrame({
+        "requests": metrics.groupby(keys).size(),
+        "failed_share": 1 - metrics.groupby(keys)["ok"].mean(),
+        "latency_mean_s": groups["latency_s"].mean(),
+        "latency_p95_s": groups["latency_s"].quantile(0.95),
+        "prompt_tokens_per_comment": groups["prompt_tokens"].sum() / comments,
+        "completion_tokens_per_comment": groups["completion_tokens"].sum() / comments,
+        "cost_per_comment_usd": groups["cost_usd"].sum(min_count=1) / comments,
+    })
+    return table.sort_values("cost_per_comment_usd")
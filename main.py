@@ -1,50 +1,140 @@
-import praw
-from collections import defaultdict
-import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import tqdm
 import pandas as pd
-
+import pyarrow as pa
+import pyarrow.compute as pc
+import requests
+
+from arcticshift.store import STORE_DIR, read_columns
+from comment_trees import author_name, iter_comment_trees
+from reddit_cache import DELETED, SUSPENDED, ProfileCache
+from reddit_client import RedditClient
 from secret import secret
 
-# Set up the Reddit API client
-reddit = praw.Reddit(**secret)
+# Set up the Reddit API client, shared by all worker threads
+client = RedditClient(secret)
+
+# Users whose histories are fetched at the same time; throughput is paced by the client's token bucket
+MAX_WORKERS = 16
+# Answer the activity check from the local Arctic Shift store instead of the API
+OFFLINE = False
+
+# Account status shared with the other scripts, so known dead accounts are skipped
+profile_cache = ProfileCache()
 
 
 def get_recent_users(subreddit_name, limit=100):
     """Fetch unique users from recent posts and comments in a subreddit."""
     users = defaultdict(lambda: defaultdict(int))
-    subreddit = reddit.subreddit(subreddit_name)
-    for submission in tqdm.tqdm(subreddit.new(limit=limit), total=limit,
-                                desc=f"Fetching users from r/{subreddit_name}"):
+    # Comment trees of many submissions are fetched concurrently while the listing pages in
+    submissions = client.listing(f"/r/{subreddit_name}/new", limit=limit)
+    for submission, comments in tqdm.tqdm(iter_comment_trees(client, submissions), total=limit,
+                                          desc=f"Fetching users from r/{subreddit_name}"):
         # Add post author
-        if submission.author:
-            users[submission.author.name]['post'] += 1
+        if author_name(submission):
+            users[author_name(submission)]['post'] += 1
         # Add comment authors
-        submission.comments.replace_more(limit=0)
-        for comment in submission.comments.list():
-            if comment.author:
-                users[comment.author.name]['comment'] += 1
+        for comment in comments:
+            if author_name(comment):
+                users[author_name(comment)]['comment'] += 1
     return users
 
 
-def check_user_activity_in_subreddits(users, target_subreddits, limit=100):
-    """Check if users are active in target subreddits and store their activity."""
-    user_activity = defaultdict(lambda: defaultdict(int))
-    for user_name in tqdm.tqdm(users, total=len(users), desc="Checking user activity"):
-        try:
-            user = reddit.redditor(user_name)
-            for comment in user.comments.new(limit=limit):
-                if comment.subreddit.display_name in target_subreddits:
-                    user_activity[user_name]['comment'] += 1
-            for submission in user.submissions.new(limit=limit):
-                if submission.subreddit.display_name in target_subreddits:
-                    user_activity[user_name]['post'] += 1
-        except Exception as e:
+def fetch_user_activity(user_name, targets, limit=100):
+    """Count a user's newest comments and posts that fall in the target subreddits (a lowercase set)."""
+    activity = {'comment': 0, 'post': 0}
+    for comment in client.user_comments(user_name, limit=limit):
+        if comment['subreddit'].lower() in targets:
+            activity['comment'] += 1
+    for submission in client.user_submissions(user_name, limit=limit):
+        if submission['subreddit'].lower() in targets:
+            activity['post'] += 1
+    return activity
+
+
+def _fetch_or_record(user_name, targets, limit):
+    try:
+        return fetch_user_activity(user_name, targets, limit)
+    except requests.HTTPError as e:
+        if e.response.status_code == 404:
+            profile_cache.put(user_name, None, DELETED)
+        elif e.response.status_code == 403:
+            profile_cache.put(user_name, None, SUSPENDED)
+        else:
             print(f"Error fetching data for user {user_name}: {e}")
-        time.sleep(0.01)  # Avoid rate-limiting
+    except Exception as e:
+        print(f"Error fetching data for user {user_name}: {e}")
+    return None
+
+
+def check_user_activity_offline(users, targets, root=STORE_DIR):
+    """Count the users' posts and comments in the target subreddits (a lowercase set) from the local Arctic Shift store.
+
+    No API calls are made, and the whole history in the dumps is counted instead of
+    the newest `limit` items.
+    """
+    user_activity = defaultdict(lambda: defaultdict(int))
+    table = read_columns(["author", "is_post"], subreddits=targets, root=root)
+    table = table.filter(pc.is_in(table["author"], value_set=pa.array(list(users), pa.string())))
+    counts = table.group_by(["author", "is_post"]).aggregate([([], "count_all")])
+    for author, is_post, count in zip(*(counts[name].to_pylist() for name in ["author", "is_post", "count_all"])):
+        user_activity[author]['post' if is_post else 'comment'] += count
     return user_activity
 
 
+def check_user_activity_in_subreddits(users, target_subreddits, limit=100, offline=OFFLINE, workers=MAX_WORKERS):
+    """Check if users are active in target subreddits and store their activity.
+
+    Users are fetched concurrently with a bounded number in flight, and subreddits are
+    matched case-insensitively against a set. With offline=True the answer comes from
+    the local Arctic Shift store instead of the API.
+    """
+    targets = {name.lower() for name in target_subreddits}
+    if offline:
+        return check_user_activity_offline(users, targets)
+    user_activity = defaultdict(lambda: defaultdict(int))
+    in_flight = deque()
+
+    def record_oldest():
+        user_name, future = in_flight.popleft()
+        activity = future.result()
+        if activity and (activity['comment'] or activity['post']):
+            user_activity[user_name].update(activity)
+        progress.update(1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            tqdm.tqdm(total=len(users), desc="Checking user activity") as progress:
+        for user_name in users:
+            if profile_cache.is_unavailable(user_name):
+                progress.update(1)
+                continue
+            in_flight.append((user_name, pool.submit(_fetch_or_record, user_name, targets, limit)))
+            if len(in_flight) >= 2 * workers:
+                record_oldest()
+        while in_flight:
+            record_oldest()
+    return user_activity
+
+
+def build_activity_frame(users, user_activity):
+    """One row per source user with their source and target counts; active users come first."""
+    names = list(users)
+    source_posts = [users[user]['post'] for user in names]
+    source_comments = [users[user]['comment'] for user in names]
+    target_posts = [user_activity[user]['post'] if user in user_activity else 0 for user in names]
+    target_comments = [user_activity[user]['comment'] if user in user_activity else 0 for user in names]
+    df = pd.DataFrame({'user': names,
+                       'source_subreddit_posts': source_posts,
+                       'source_subreddit_comments': source_comments,
+                       'target_subreddit_posts': target_posts,
+                       'target_subreddit_comments': target_comments})
+    df['source_subreddit_total'] = df['source_subreddit_posts'] + df['source_subreddit_comments']
+    df['target_subreddit_total'] = df['target_subreddit_posts'] + df['target_subreddit_comments']
+    active = df['target_subreddit_total'] > 0
+    return pd.concat([df[active], df[~active]], ignore_index=True)
+
+
 def main():
     limit = 25
     # Define the subreddits to check
@@ -63,33 +153,7 @@ def main():
 
     # Take the users who are active in the target subreddits and save a df with the comments and posts of these users
     # in the source and target subreddit
-
-    df = pd.DataFrame(columns=['user', 'source_subreddit_posts', 'source_subreddit_comments',
-                               'target_subreddit_posts', 'target_subreddit_comments',
-                               'source_subreddit_total', 'target_subreddit_total'])
-
-    for user in user_activity:
-        if user_activity[user]['comment'] > 0 or user_activity[user]['post'] > 0:
-            df = df._append({'user': user,
-                             'source_subreddit_posts': users_in_sarcasm[user]['post'],
-                             'source_subreddit_comments': users_in_sarcasm[user]['comment'],
-                             'target_subreddit_posts': user_activity[user]['post'],
-                             'target_subreddit_comments': user_activity[user]['comment'],
-                             'source_subreddit_total': users_in_sarcasm[user]['post'] + users_in_sarcasm[user][
-                                 'comment'],
-                             'target_subreddit_total': user_activity[user]['post'] + user_activity[user]['comment']},
-                            ignore_index=True)
-    for user in users_in_sarcasm:
-        if user not in user_activity:
-            df = df._append({'user': user,
-                             'source_subreddit_posts': users_in_sarcasm[user]['post'],
-                             'source_subreddit_comments': users_in_sarcasm[user]['comment'],
-                             'target_subreddit_posts': 0,
-                             'target_subreddit_comments': 0,
-                             'source_subreddit_total': users_in_sarcasm[user]['post'] + users_in_sarcasm[user][
-                                 'comment'],
-                             'target_subreddit_total': 0}, ignore_index=True)
-
+    df = build_activity_frame(users_in_sarcasm, user_activity)
     df.to_csv('users_activity.csv', index=False)
 
 
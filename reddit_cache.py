@@ -0,0 +1,184 @@
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import prawcore
+
+PROFILE_CACHE_PATH = "user_profiles.sqlite"
+PROFILE_TTL = 30 * 24 * 3600   # seconds before a cached profile is fetched again
+PROFILE_MAX_ENTRIES = 1_000_000
+TRIM_EVERY = 1000  # puts between checks of the cache size
+
+HISTORY_CACHE_PATH = "user_history.sqlite"
+HISTORY_MAX_AGE = 24 * 3600  # seconds a fetched history is trusted without asking the API again
+QUERY_BATCH = 500  # usernames per SQL query, below SQLite's limit on bound parameters
+
+# Account states stored in the cache
+ACTIVE = "active"
+DELETED = "deleted"
+SUSPENDED = "suspended"
+
+
+def fetch_profile(reddit, username):
+    """Fetch (created_utc, status) for a user with praw.
+
+    Missing and suspended accounts are answers worth caching; any other error
+    (e.g. a 429) is raised so the caller can retry.
+    """
+    try:
+        user = reddit.redditor(username)
+        if getattr(user, "is_suspended", False):
+            return None, SUSPENDED
+        return user.created_utc, ACTIVE
+    except prawcore.exceptions.NotFound:
+        return None, DELETED
+    except prawcore.exceptions.Forbidden:
+        return None, SUSPENDED
+
+
+class ProfileCache:
+    """Persistent user-profile cache shared by the Reddit-facing scripts.
+
+    Entries expire after ttl seconds, and once the cache holds more than max_entries
+    profiles the least recently used ones are evicted. The connection is guarded by a
+    lock so worker threads can share one cache.
+    """
+
+    def __init__(self, path=PROFILE_CACHE_PATH, ttl=PROFILE_TTL, max_entries=PROFILE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (username TEXT PRIMARY KEY, created_utc REAL, status TEXT,
+                                                 fetched_at REAL, last_used REAL)
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS profiles_last_used ON profiles (last_used)")
+        self.conn.commit()
+
+    def get(self, username):
+        """Return {'created_utc', 'status', 'fetched_at'} or None when missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT created_utc, status, fetched_at FROM profiles WHERE username = ?",
+                                    (username,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE profiles SET last_used = ? WHERE username = ?", (now, username))
+        return {"created_utc": row[0], "status": row[1], "fetched_at": row[2]}
+
+    def put(self, username, created_utc, status):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)",
+                              (username, created_utc, status, now, now))
+            self.puts += 1
+            if self.puts % TRIM_EVERY == 0:
+                self._trim()
+
+    def _trim(self):
+        """Evict the least recently used profiles beyond max_entries."""
+        size = self.conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        if size > self.max_entries:
+            self.conn.execute("""
+                DELETE FROM profiles WHERE username IN
+                    (SELECT username FROM profiles ORDER BY last_used LIMIT ?)
+            """, (size - self.max_entries,))
+
+    def is_unavailable(self, username):
+        """True when the cache knows the account is deleted or suspended."""
+        profile = self.get(username)
+        return profile is not None and profile["status"] != ACTIVE
+
+    def close(self):
+        self.conn.close()
+
+
+class HistoryCache:
+    """Persistent per-user cache of fetched comments and submissions.
+
+    Items of every subreddit are kept, so one fetch can answer questions about any
+    set of subreddits later. The newest timestamp per user and kind is the watermark
+    incremental fetches page back to.
+    """
+
+    def __init__(self, path=HISTORY_CACHE_PATH, max_age=HISTORY_MAX_AGE):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (username TEXT, kind TEXT, id TEXT, subreddit TEXT,
+                                              created_utc REAL, text TEXT, PRIMARY KEY (username, kind, id));
+            CREATE TABLE IF NOT EXISTS fetches (username TEXT PRIMARY KEY, fetched_at REAL);
+        """)
+        self.conn.commit()
+
+    def is_fresh(self, username):
+        with self.lock:
+            row = self.conn.execute("SELECT fetched_at FROM fetches WHERE username = ?", (username,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.max_age
+
+    def watermarks(self, username):
+        """Newest cached created_utc per kind ('comment'/'post') for a user."""
+        with self.lock:
+            rows = self.conn.execute("SELECT kind, MAX(created_utc) FROM items WHERE username = ? GROUP BY kind",
+                                     (username,)).fetchall()
+        return dict(rows)
+
+    def add(self, username, items):
+        """Store (kind, id, subreddit, created_utc, text) tuples and mark the user as fetched now."""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO items VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(username, *item) for item in items])
+            self.conn.execute("INSERT OR REPLACE INTO fetches VALUES (?, ?)", (username, time.time()))
+
+    def activity(self, username, subreddits):
+        """Cached activity sorted into {subreddit: {'posts': [...], 'comments': [...]}}, newest first.
+
+        Subreddits are matched case-insensitively; posts carry created_utc, comments
+        also carry their text.
+        """
+        activity = {subreddit_name: {'posts': [], 'comments': []} for subreddit_name in subreddits}
+        by_lower = {subreddit_name.lower(): subreddit_name for subreddit_name in subreddits}
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT kind, subreddit, created_utc, text FROM items WHERE username = ? ORDER BY created_utc DESC
+            """, (username,)).fetchall()
+        for kind, subreddit_name, created_utc, text in rows:
+            target = by_lower.get(subreddit_name.lower())
+            if target is None:
+                continue
+            if kind == 'comment':
+                activity[target]['comments'].append({'text': text, 'created_utc': created_utc})
+            else:
+                activity[target]['posts'].append({'created_utc': created_utc})
+        return activity
+
+    def events(self, usernames, subreddits):
+        """Flat author/subreddit/created_utc/is_post table of the cached items of many users.
+
+        Only the given subreddits are kept, matched case-insensitively and named as given.
+        """
+        by_lower = {subreddit_name.lower(): subreddit_name for subreddit_name in subreddits}
+        usernames = list(usernames)
+        rows = []
+        for start in range(0, len(usernames), QUERY_BATCH):
+            batch = usernames[start:start + QUERY_BATCH]
+            with self.lock:
+                rows.extend(self.conn.execute(f"""
+                    SELECT username, lower(subreddit), created_utc, kind = 'post' FROM items
+                    WHERE username IN ({",".join("?" * len(batch))})
+                      AND lower(subreddit) IN ({",".join("?" * len(by_lower))})
+                """, batch + list(by_lower)).fetchall())
+        events = pd.DataFrame(rows, columns=["author", "subreddit", "created_utc", "is_post"])
+        events["subreddit"] = events["subreddit"].map(by_lower)
+        events["is_post"] = events["is_post"].astype(bool)
+        return events
+
+    def close(self):
+        self.conn.close()
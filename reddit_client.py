@@ -0,0 +1,135 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OAUTH_URL = "https://oauth.reddit.com"
+AUTH_URL = "https://www.reddit.com/api/v1/access_token"
+
+REQUESTS_PER_MINUTE = 100  # Reddit's free-tier OAuth quota
+POOL_SIZE = 32             # pooled HTTP connections, one per concurrent worker
+MAX_RETRIES = 3
+LISTING_PAGE_SIZE = 100    # the largest page Reddit serves
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker talking to the API."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update(self, remaining, reset):
+        """Re-pace the bucket from Reddit's X-Ratelimit-Remaining/Reset headers.
+
+        The remaining quota is spread evenly over the seconds left in the window, and
+        when it is used up nothing more is handed out until the window resets.
+        """
+        with self.lock:
+            self._refill()
+            reset = max(reset, 1.0)
+            self.tokens = min(self.tokens, remaining)
+            self.rate = max(remaining, 1.0) / reset
+
+
+class RedditClient:
+    """Minimal OAuth client for Reddit's JSON API that many threads can share.
+
+    Connections are pooled in one requests.Session and every call goes through a
+    shared TokenBucket that follows the rate-limit headers of the responses.
+    base_url and auth_url can point at a local fake server for testing.
+    """
+
+    def __init__(self, secret, base_url=OAUTH_URL, auth_url=AUTH_URL, pool_size=POOL_SIZE,
+                 requests_per_minute=REQUESTS_PER_MINUTE):
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self.auth_url = auth_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = secret.get("user_agent", "python:reddit_client")
+        self.bucket = TokenBucket(requests_per_minute / 60, capacity=requests_per_minute / 10)
+        self.auth_lock = threading.Lock()
+        self.token = None
+
+    def _authenticate(self, stale=None):
+        """Fetch a new access token unless another thread already replaced the stale one."""
+        with self.auth_lock:
+            if self.token is not None and self.token != stale:
+                return
+            if "username" in self.secret:
+                data = {"grant_type": "password", "username": self.secret["username"],
+                        "password": self.secret["password"]}
+            else:
+                data = {"grant_type": "client_credentials"}
+            response = self.session.post(self.auth_url, data=data,
+                                         auth=(self.secret["client_id"], self.secret["client_secret"]))
+            response.raise_for_status()
+            self.token = response.json()["access_token"]
+
+    def _update_rate_limit(self, headers):
+        if "X-Ratelimit-Remaining" in headers and "X-Ratelimit-Reset" in headers:
+            self.bucket.update(float(headers["X-Ratelimit-Remaining"]), float(headers["X-Ratelimit-Reset"]))
+
+    def get(self, path, params=None):
+        """GET an API path and return the decoded JSON, retrying on 401/429/5xx."""
+        if self.token is None:
+            self._authenticate()
+        for retry in range(MAX_RETRIES + 1):
+            self.bucket.acquire()
+            token = self.token
+            response = self.session.get(f"{self.base_url}{path}", params=params,
+                                        headers={"Authorization": f"bearer {token}"})
+            self._update_rate_limit(response.headers)
+            if response.status_code == 401 and retry < MAX_RETRIES:
+                self._authenticate(stale=token)
+                continue
+            if response.status_code == 429 and retry < MAX_RETRIES:
+                time.sleep(float(response.headers.get("X-Ratelimit-Reset", 2 ** retry)))
+                continue
+            if response.status_code >= 500 and retry < MAX_RETRIES:
+                time.sleep(2 ** retry)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def listing(self, path, params=None, limit=None):
+        """Yield the "data" of every child of a listing, following the "after" cursor."""
+        params = dict(params or {})
+        fetched = 0
+        while limit is None or fetched < limit:
+            page_size = LISTING_PAGE_SIZE if limit is None else min(LISTING_PAGE_SIZE, limit - fetched)
+            page = self.get(path, params={**params, "limit": page_size, "raw_json": 1})["data"]
+            for child in page["children"]:
+                yield child["data"]
+            fetched += len(page["children"])
+            if not page.get("after") or not page["children"]:
+                return
+            params["after"] = page["after"]
+
+    def user_comments(self, username, limit=None):
+        return self.listing(f"/user/{username}/comments", params={"sort": "new"}, limit=limit)
+
+    def user_submissions(self, username, limit=None):
+        return self.listing(f"/user/{username}/submitted", params={"sort": "new"}, limit=limit)
@@ -0,0 +1,150 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+N_BOOT = 1000     # bootstrap resamples of the targets for the confidence intervals
+BOOT_TASKS = 32   # resamples per worker task
+CI = 0.95
+
+_worker_rows = None
+
+ICC_TYPES = [
+    ("ICC1", "Single raters absolute"),
+    ("ICC2", "Single random raters"),
+    ("ICC3", "Single fixed raters"),
+    ("ICC1k", "Average raters absolute"),
+    ("ICC2k", "Average random raters"),
+    ("ICC3k", "Average fixed raters"),
+]
+
+
+def score_matrix(df, target, raters):
+    """Wide n x k matrix of ratings with one row per target, keyed by integer ids.
+
+    Targets are factorized instead of grouped on their text, repeated targets are
+    averaged (as pingouin's pivot does), and targets with a missing rating are dropped.
+    """
+    ids, _ = pd.factorize(df[target])
+    scores = df[raters].to_numpy(dtype=float)
+    scores, ids = scores[ids >= 0], ids[ids >= 0]
+    n = ids.max() + 1 if len(ids) else 0
+    # A missing rating makes its target's sum NaN, which drops the target below
+    sums = np.column_stack([np.bincount(ids, weights=scores[:, j], minlength=n) for j in range(scores.shape[1])])
+    matrix = sums / np.bincount(ids, minlength=n)[:, None]
+    return matrix[np.isfinite(matrix).all(axis=1)]
+
+
+def row_stats(matrix):
+    """Additive per-target statistics: 1, sum, sum of squares, squared sum and the ratings themselves."""
+    row_sum = matrix.sum(axis=1)
+    return np.column_stack([np.ones(len(matrix)), row_sum, (matrix ** 2).sum(axis=1), row_sum ** 2, matrix])
+
+
+def icc_from_totals(totals):
+    """All six ICCs plus their F tests from summed row_stats, via the closed-form ANOVA sums of squares."""
+    n, total, total_sq, row_sq = totals[:4]
+    col_sums = totals[4:]
+    k = len(col_sums)
+    correction = total ** 2 / (n * k)
+    ss_total = total_sq - correction
+    ss_rows = row_sq / k - correction
+    ss_cols = (col_sums ** 2).sum() / n - correction
+    ss_error = ss_total - ss_rows - ss_cols
+
+    ms_rows = ss_rows / (n - 1)
+    ms_cols = ss_cols / (k - 1)
+    ms_error = ss_error / ((n - 1) * (k - 1))
+    ms_within = (ss_cols + ss_error) / (n * (k - 1))
+
+    icc = {
+        "ICC1": (ms_rows - ms_within) / (ms_rows + (k - 1) * ms_within),
+        "ICC2": (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error + k * (ms_cols - ms_error) / n),
+        "ICC3": (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error),
+        "ICC1k": (ms_rows - ms_within) / ms_rows,
+        "ICC2k": (ms_rows - ms_error) / (ms_rows + (ms_cols - ms_error) / n),
+        "ICC3k": (ms_rows - ms_error) / ms_rows,
+    }
+    f_within, f_error = ms_rows / ms_within, ms_rows / ms_error
+    df_within, df_error = n * (k - 1), (n - 1) * (k - 1)
+    tests = {name: (f_within, n - 1, df_within) if name.startswith("ICC1") else (f_error, n - 1, df_error)
+             for name in icc}
+    return icc, tests
+
+
+def _init_worker(stats_rows):
+    global _worker_rows
+    _worker_rows = stats_rows
+
+
+def _bootstrap(n_boot, seed):
+    rng = np.random.default_rng(seed)
+    n = len(_worker_rows)
+    # How often each target is drawn, times the per-target statistics, gives the resample's totals
+    return [list(icc_from_totals(np.bincount(rng.integers(0, n, n), minlength=n) @ _worker_rows)[0].values())
+            for _ in range(n_boot)]
+
+
+def bootstrap_icc(matrix, n_boot=N_BOOT, workers=None, seed=0):
+    """ICC values of n_boot resamples of the targets, as an (n_boot, 6) array.
+
+    Each resample is one weighted sum of the per-target statistics, and the resamples
+    are spread over a process pool with independent random streams.
+    """
+    sizes = [min(BOOT_TASKS, n_boot - start) for start in range(0, n_boot, BOOT_TASKS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(row_stats(matrix),)) as pool:
+        return np.array([row for result in pool.map(_bootstrap, sizes, seeds) for row in result])
+
+
+def icc_table(totals, boot=None, ci=CI):
+    """pingouin-style table: Type, Description, ICC, F, df1, df2, pval and the bootstrap CI."""
+    icc, tests = icc_from_totals(totals)
+    table = pd.DataFrame({
+        "Type": [name for name, _ in ICC_TYPES],
+        "Description": [description for _, description in ICC_TYPES],
+        "ICC": [icc[name] for name, _ in ICC_TYPES],
+        "F": [tests[name][0] for name, _ in ICC_TYPES],
+        "df1": [tests[name][1] for name, _ in ICC_TYPES],
+        "df2": [tests[name][2] for name, _ in ICC_TYPES],
+    })
+    table["pval"] = stats.f.sf(table["F"], table["df1"], table["df2"])
+    if boot is not None:
+        alpha = (1 - ci) / 2
+        table[f"CI{round(ci * 100)}%"] = [np.round(np.nanquantile(boot[:, i], [alpha, 1 - alpha]), 2).tolist()
+                                         for i in range(len(ICC_TYPES))]
+    return table
+
+
+def intraclass_corr(df, target, raters, n_boot=N_BOOT, workers=None, seed=0):
+    """ICC(1/2/3) for single and average ratings of a wide table with one column per rater."""
+    matrix = score_matrix(df, target, raters)
+    boot = bootstrap_icc(matrix, n_boot, workers, seed) if n_boot else None
+    return icc_table(row_stats(matrix).sum(axis=0), boot)
+
+
+class StreamingICC:
+    """ICC statistics updated as new labeled targets arrive, without keeping the ratings.
+
+    Every update adds the per-target sums of new rows, so each row must be a new
+    target (e.g. comments newly labeled by the LLM); rows with a missing rating are
+    skipped.
+    """
+
+    def __init__(self, n_raters):
+        self.totals = np.zeros(4 + n_raters)
+
+    def update(self, scores):
+        matrix = np.asarray(scores, dtype=float)
+        matrix = matrix[np.isfinite(matrix).all(axis=1)]
+        self.totals += row_stats(matrix).sum(axis=0)
+
+    @property
+    def n_targets(self):
+        return int(self.totals[0])
+
+    def table(self):
+        return icc_table(self.totals)
@@ -0,0 +1,77 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from dataset_io import iter_dataset
+
+QUANTILE_BINS = 2_000  # resolution of the histograms quantiles are read from
+
+
+class StreamingHistogram:
+    """Fixed-bin histogram of a bounded column, filled one chunk at a time in constant memory.
+
+    Values outside [low, high] are clipped into the edge bins and missing values are
+    counted separately. Quantiles are interpolated within bins, so they are exact to
+    within one bin width.
+    """
+
+    def __init__(self, low, high, bins=QUANTILE_BINS):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.missing = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        present = ~np.isnan(values)
+        self.missing += int((~present).sum())
+        # digitize against the inner edges gives the bin of every value, the last bin closed
+        bins = np.digitize(values[present], self.edges[1:-1])
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def rebin(self, bins):
+        """Coarser histogram with the given number of bins (which must divide the current one)."""
+        coarse = StreamingHistogram(self.edges[0], self.edges[-1], bins)
+        coarse.counts = self.counts.reshape(bins, -1).sum(axis=1)
+        coarse.missing = self.missing
+        return coarse
+
+    def quantile(self, q):
+        """Quantile(s) q in [0, 1] of the values seen so far, NaN when there were none."""
+        q = np.asarray(q, dtype=float)
+        if not self.total:
+            return np.full(q.shape, np.nan)
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        return np.interp(q * self.total, cumulative, self.edges)
+
+
+class CategoryCounts:
+    """Running counts of category labels, reported like value_counts(normalize=True)."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.counts = Counter()
+
+    def update(self, categories):
+        labels, counts = np.unique(np.asarray(categories), return_counts=True)
+        self.counts.update(dict(zip(labels.tolist(), counts.tolist())))
+
+    def proportions(self):
+        counts = pd.Series(self.counts, dtype=np.int64).sort_values(ascending=False, kind="stable")
+        counts.index.name = self.name
+        return (counts / counts.sum()).rename("proportion")
+
+
+def summarize(path, histograms):
+    """Feed every histogram its column in one chunked pass that reads only those columns.
+
+    histograms maps column -> StreamingHistogram; the same dict is returned.
+    """
+    for chunk in iter_dataset(path, columns=list(histograms)):
+        for column, histogram in histograms.items():
+            histogram.update(chunk[column].to_numpy(dtype=float, na_value=np.nan))
+    return histograms